@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of GameManager.is_playing and GameManager.create_game with many active games
+--------------------
+Usage: python benchmarks/bench_game_manager.py [games]
+The linear is_playing scan that GameManager used before the player index is timed for comparison.
+"""
+
+import os, sys, time, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from games import GameManager
+
+
+class FakeGuild:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeMember:
+    def __init__(self, id, guild):
+        self.id = id
+        self.guild = guild
+        self.name = 'Player{0}'.format(id)
+
+
+def linear_is_playing(game_manager, user):
+    for game_id in game_manager.games.keys():
+        game = game_manager.games[game_id]
+        if game.host_id == user.id:
+            return 1
+        elif game.opponent_id == user.id:
+            return 1
+    return 0
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    guilds = [FakeGuild(i) for i in range(100)]
+    members = [FakeMember(i, guilds[i % len(guilds)]) for i in range(2 * games + 2)]
+
+    game_manager = GameManager()
+    start = time.perf_counter()
+    for i in range(games):
+        game_manager.create_game(members[2 * i], members[2 * i + 1], 10)
+    elapsed = time.perf_counter() - start
+    print('create_game:            {0:.2f} us/call ({1} games)'.format(1e6 * elapsed / games, games))
+
+    idle = members[-1]
+    number = 10000
+    elapsed = timeit.timeit(lambda: game_manager.is_playing(idle), number=number)
+    print('is_playing (index):     {0:.3f} us/call'.format(1e6 * elapsed / number))
+    number = 10
+    elapsed = timeit.timeit(lambda: linear_is_playing(game_manager, idle), number=number)
+    print('is_playing (old scan):  {0:.3f} us/call'.format(1e6 * elapsed / number))
+
+    number = 100
+    elapsed = timeit.timeit(lambda: game_manager.games_in_guild(6), number=number)
+    print('games_in_guild:         {0:.3f} us/call ({1} games)'.format(1e6 * elapsed / number, len(game_manager.games_in_guild(6))))
+    now = time.monotonic() + 10
+    elapsed = timeit.timeit(lambda: game_manager.past_deadline(now - 10), number=number)
+    print('past_deadline (none):   {0:.3f} us/call'.format(1e6 * elapsed / number))
+
+    start = time.perf_counter()
+    for game in list(game_manager.games.values()):
+        game_manager.abort(game)
+    elapsed = time.perf_counter() - start
+    print('abort:                  {0:.2f} us/call, {1} players left indexed'.format(1e6 * elapsed / games, len(game_manager.players)))
+
+
+if __name__ == '__main__':
+    main()
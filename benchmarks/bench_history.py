@@ -0,0 +1,66 @@
+"""
+Measures the write throughput of the batched MatchHistory writer, and the latency of the leaderboard and stats queries
+--------------------
+Usage: python benchmarks/bench_history.py [matches] [players]
+The database is created in a temporary directory. record() is called at full speed from the event loop,
+and the loop lag while the writer thread works is reported too.
+"""
+
+import asyncio, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from history import MatchHistory
+
+
+async def lag_probe(lags, interval=0.01):
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def run(path, matches, players):
+    match_history = MatchHistory(path)
+    moves = ['r', 's', 'p', 'ff', 'fft']
+    rng = random.Random(1)
+    lags = []
+    probe = asyncio.ensure_future(lag_probe(lags))
+
+    start = time.perf_counter()
+    for i in range(matches):
+        host_id = rng.randrange(players)
+        opponent_id = (host_id + 1 + rng.randrange(players - 1)) % players
+        winner_id = (host_id, opponent_id, None)[i % 3]
+        match_history.record(i % 10, host_id, opponent_id, rng.choice(moves), rng.choice(moves), winner_id, None, 5.0)
+        if i % 1000 == 999:
+            # Let the loop run, as it would between commands
+            await asyncio.sleep(0)
+    record_done = time.perf_counter() - start
+    await match_history.flush()
+    elapsed = time.perf_counter() - start
+    probe.cancel()
+
+    query_start = time.perf_counter()
+    for i in range(100):
+        await match_history.leaderboard(i % 10)
+    leaderboard = (time.perf_counter() - query_start) / 100
+    query_start = time.perf_counter()
+    for i in range(100):
+        await match_history.stats(i % 10, i)
+    stats = (time.perf_counter() - query_start) / 100
+    await match_history.close()
+    return record_done, elapsed, leaderboard, stats, max(lags) if lags else 0.0
+
+
+def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    with tempfile.TemporaryDirectory() as tmp:
+        record_done, elapsed, leaderboard, stats, lag = asyncio.run(run(os.path.join(tmp, 'history.db'), matches, players))
+    print('recorded {0} matches: {1:.0f} matches/s queued, {2:.0f} matches/s written to disk'.format(matches, matches / record_done, matches / elapsed))
+    print('leaderboard {0:.2f} ms, stats {1:.2f} ms, max event loop lag {2:.1f} ms'.format(1000 * leaderboard, 1000 * stats, 1000 * lag))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Measures MatchQueue enqueue/match throughput and the queue wait of players during a simulated peak hour
+--------------------
+Usage: python benchmarks/bench_matchmaking.py [players] [arrivals_per_second]
+Players with normally distributed ratings join at a steady rate over simulated time; match_waiting and expire
+run every simulated second, like the bot's match_queued_players loop. Paired players leave the queue.
+"""
+
+import os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from matchmaking import MatchQueue, QueueEntry
+
+
+class FakeMember:
+    def __init__(self, id):
+        self.id = id
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rng = random.Random(1)
+    entries = [QueueEntry(FakeMember(i), None, rng.gauss(1000, 200), i / rate, 10) for i in range(players)]
+
+    match_queue = MatchQueue(lambda member: 0)
+    pairs = 0
+    peak = 0
+    next_tick = 1.0
+    start = time.perf_counter()
+    for entry in entries:
+        now = entry.joined
+        while next_tick <= now:
+            pairs += len(match_queue.match_waiting(next_tick))
+            match_queue.expire(next_tick)
+            next_tick += 1.0
+        if match_queue.add(entry, now) is not None:
+            pairs += 1
+        peak = max(peak, len(match_queue))
+    elapsed = time.perf_counter() - start
+
+    waits = sorted(match_queue.wait_times)
+    print('{0} players in {1:.0f} simulated seconds: {2:.0f} enqueues/s, {3:.1f} us per enqueue including matching'.format(players, players / rate, players / elapsed, 1e6 * elapsed / players))
+    print('{0} pairs, {1} evicted, at most {2} waiting at once'.format(pairs, match_queue.evicted, peak))
+    print('queue wait of the last {0} paired players: p50 {1:.2f}s, p99 {2:.2f}s'.format(len(waits), waits[len(waits) // 2], waits[int(0.99 * (len(waits) - 1))]))
+
+
+if __name__ == '__main__':
+    main()
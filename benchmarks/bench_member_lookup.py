@@ -0,0 +1,85 @@
+"""
+Measures how long resolving the opponent of a !rps command takes as the guild grows
+--------------------
+Usage: python benchmarks/bench_member_lookup.py
+The old lookup built a dictionary of every member of the guild on each command.
+MemberCache looks the member up by id, and fetches it (with simulated latency) only when it is not cached.
+"""
+
+import asyncio, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from members import MemberCache, parse_user_id
+
+
+class FakeMember:
+    def __init__(self, id, guild):
+        self.id = id
+        self.guild = guild
+
+
+class FakeGuild:
+    def __init__(self, id, size, cached=True, fetch_latency=0.05):
+        self.id = id
+        self._all = {i: FakeMember(i, self) for i in range(size)}
+        self._members = self._all if cached else {}
+        self.fetch_latency = fetch_latency
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+    async def fetch_member(self, user_id):
+        await asyncio.sleep(self.fetch_latency)
+        return self._all[user_id]
+
+
+def old_lookup(guild, mention1):
+    id_to_member = {}
+    for member in guild.members:
+        id_to_member[str(member.id)] = member
+
+    mention1_user_id = ""
+    for c in mention1:
+        if '0'<=c and c<='9':
+            mention1_user_id += c
+    return id_to_member[mention1_user_id]
+
+
+async def run(size, commands):
+    guild = FakeGuild(1, size)
+    mentions = ['<@!{0}>'.format((i * 7919) % size) for i in range(commands)]
+
+    start = time.perf_counter()
+    for mention in mentions[:20]:
+        old_lookup(guild, mention)
+    old = (time.perf_counter() - start) / 20
+
+    member_cache = MemberCache()
+    start = time.perf_counter()
+    for mention in mentions:
+        await member_cache.resolve(guild, parse_user_id(mention))
+    new = (time.perf_counter() - start) / commands
+
+    # A guild whose members are not cached, where 200 active players keep challenging each other:
+    # the first lookup of a player fetches, repeated lookups hit the LRU cache
+    uncached = FakeGuild(2, size, cached=False, fetch_latency=0.001)
+    member_cache = MemberCache()
+    start = time.perf_counter()
+    for i in range(commands):
+        await member_cache.resolve(uncached, parse_user_id('<@{0}>'.format((i * 7919) % 200)))
+    lru = (time.perf_counter() - start) / commands
+    return old, new, lru, member_cache.fetches
+
+
+def main():
+    for size in (1000, 10000, 100000):
+        old, new, lru, fetches = asyncio.run(run(size, 2000))
+        print('{0:>7} members: old {1:9.1f} us/command, cached {2:6.2f} us/command, uncached+LRU {3:8.1f} us/command ({4} fetches)'.format(size, 1e6 * old, 1e6 * new, 1e6 * lru, fetches))
+
+
+if __name__ == '__main__':
+    main()
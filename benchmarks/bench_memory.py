@@ -0,0 +1,87 @@
+"""
+Compares the memory and startup time the discord.py cache takes for a synthetic large guild in the Intents.all() mode and in the low-memory mode
+--------------------
+Usage: python benchmarks/bench_memory.py [members]
+The same GUILD_CREATE payload, with every member online, is fed to the client's connection state in both modes, as the gateway
+would after login, so whatever is not cached was dropped by the mode's own settings. A bot that chunks guilds at startup then
+gets every member again in GUILD_MEMBERS_CHUNK events of CHUNK_SIZE members, which are fed to it too. Only the time the bot
+spends on the payloads is measured; the gateway round trips of the chunks are not. No connection to Discord is made.
+"""
+
+import asyncio, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from discord.ext import commands
+from discord.state import ChunkRequest
+from memory_mode import bot_options
+
+CHUNK_SIZE = 1000
+
+
+def guild_payload(guild_id, members):
+    member_data = []
+    presence_data = []
+    for i in range(members):
+        user = {'id': str(10**6 + i), 'username': 'player{0}'.format(i), 'discriminator': '0', 'avatar': None, 'global_name': None}
+        member_data.append({'user': user, 'roles': [], 'joined_at': '2021-02-10T00:00:00+00:00', 'deaf': False, 'mute': False, 'flags': 0})
+        presence_data.append({'user': {'id': user['id']}, 'status': 'online', 'activities': [{'name': 'Rock Paper Scissors', 'type': 0}], 'client_status': {'desktop': 'online'}})
+
+    return {
+        'id': str(guild_id), 'name': 'Synthetic guild', 'icon': None, 'owner_id': str(10**6),
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+        'emojis': [], 'features': [], 'member_count': members, 'members': member_data, 'presences': presence_data,
+        'channels': [{'id': str(guild_id + 1), 'type': 0, 'name': 'general', 'position': 0, 'permission_overwrites': []}],
+        'threads': [], 'stickers': [], 'large': True, 'unavailable': False,
+    }
+
+
+def chunk_payloads(guild_id, payload, nonce):
+    members, presences = payload['members'], payload['presences']
+    count = (len(members) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    for index in range(count):
+        yield {'guild_id': str(guild_id), 'members': members[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE],
+               'presences': presences[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE], 'chunk_index': index, 'chunk_count': count, 'nonce': nonce}
+
+
+def load(bot, payload):
+    # Returns the guild, the seconds until its GUILD_CREATE was processed and until it was ready, and the number of chunks
+    state = bot._connection
+    chunks = 0
+    start = time.perf_counter()
+    guild = state._add_guild_from_data(payload)
+    loaded = time.perf_counter() - start
+    if state._chunk_guilds:
+        # What guild.chunk() registers before it asks the gateway for the members
+        request = ChunkRequest(guild.id, 0, asyncio.get_running_loop(), state._get_guild, cache=state.member_cache_flags.joined)
+        state._chunk_requests[request.nonce] = request
+        for chunk in chunk_payloads(guild.id, payload, request.nonce):
+            state.parse_guild_members_chunk(chunk)
+            chunks += 1
+    return guild, loaded, time.perf_counter() - start, chunks
+
+
+async def measure(low_memory, members):
+    # Timed without tracemalloc, which slows every allocation down
+    guild, loaded, elapsed, chunks = load(commands.Bot(command_prefix='!', **bot_options(low_memory)), guild_payload(1, members))
+    del guild
+
+    payload = guild_payload(1, members)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    guild = load(commands.Bot(command_prefix='!', **bot_options(low_memory)), payload)[0]
+    del payload
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, loaded, elapsed, chunks, len(guild._members)
+
+
+def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, low_memory in (('Intents.all()', False), ('low-memory', True)):
+        used, loaded, elapsed, chunks, cached = asyncio.run(measure(low_memory, members))
+        print('{0:>13}: {1:8.1f} MiB for the guild, {2} members cached, guild loaded in {3:.2f}s, {4} chunks, ready after {5:.2f}s'.format(
+            name, used / 2**20, cached, loaded, chunks, elapsed))
+
+
+if __name__ == '__main__':
+    main()
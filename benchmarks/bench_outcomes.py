@@ -0,0 +1,83 @@
+"""
+Compares the if/else rps_test that the bot used before outcomes.MoveSet with the precomputed outcome matrix
+--------------------
+Usage: python benchmarks/bench_outcomes.py [pairs]
+Resolves random pairs of responses one by one with both, and all at once with MoveSet.resolve_many
+(with numpy arrays too, if numpy is installed). Every time is the best of REPEATS runs.
+"""
+
+import os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import outcomes
+from outcomes import RPS, RPSLS, MoveSet
+
+REPEATS = 5
+
+
+def old_rps_test(a, b):
+    if a[0] == b[0]:
+        return 0
+    if a == 'ff' or a == 'fft':
+        return -1
+    if b == 'ff' or b == 'fft':
+        return 1
+
+    if a == 'r':
+        if b == 's':
+            return 1
+        elif b == 'p':
+            return -1
+    elif a == 's':
+        if b == 'p':
+            return 1
+        elif b == 'r':
+            return -1
+    elif a == 'p':
+        if b == 'r':
+            return 1
+        elif b == 's':
+            return -1
+
+
+def timed(func):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = random.Random(1)
+    a_chars = [rng.choice(RPS.chars) for _ in range(pairs)]
+    b_chars = [rng.choice(RPS.chars) for _ in range(pairs)]
+    a_codes = [RPS.code(char) for char in a_chars]
+    b_codes = [RPS.code(char) for char in b_chars]
+
+    old, old_results = timed(lambda: [old_rps_test(a, b) for a, b in zip(a_chars, b_chars)])
+    # Bound once, like old_rps_test is one global function
+    resolve = RPS.resolve
+    new, new_results = timed(lambda: [resolve(a, b) for a, b in zip(a_chars, b_chars)])
+    batch, batch_results = timed(lambda: RPS.resolve_many(a_codes, b_codes))
+    assert old_results == new_results == batch_results
+    print('rps_test (if/else):        {0:.1f} ns/pair'.format(1e9 * old / pairs))
+    print('MoveSet.resolve:           {0:.1f} ns/pair'.format(1e9 * new / pairs))
+    print('MoveSet.resolve_many:      {0:.1f} ns/pair'.format(1e9 * batch / pairs))
+    if outcomes.numpy is not None:
+        a_array = outcomes.numpy.array(a_codes)
+        b_array = outcomes.numpy.array(b_codes)
+        vectorized, _ = timed(lambda: RPS.resolve_many(a_array, b_array))
+        print('MoveSet.resolve_many (numpy): {0:.1f} ns/pair'.format(1e9 * vectorized / pairs))
+
+    for move_set in (RPSLS, MoveSet.cyclic(15)):
+        codes = [rng.randrange(move_set.size) for _ in range(2 * pairs)]
+        elapsed, _ = timed(lambda: move_set.resolve_many(codes[:pairs], codes[pairs:]))
+        print('{0} resolve_many: {1:.1f} ns/pair'.format(move_set.name, 1e9 * elapsed / pairs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures the prediction throughput of MovePredictor, the memory of its models per user, and how often it beats scripted players
+--------------------
+Usage: python benchmarks/bench_predictor.py [users] [rounds_per_user]
+Every user plays rounds_per_user rounds of RPS (and RPSLS) against the predictor. The users follow one of a few habits:
+random moves, a favourite move, a cycle, or copying the bot's last move.
+"""
+
+import os, random, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from outcomes import RPS, RPSLS
+from predictor import MovePredictor
+
+
+def habits(move_set, rng):
+    chars = move_set.chars[:len(move_set.moves)]
+    favourite = rng.choice(chars)
+    return {
+        'random': lambda i, last_bot: rng.choice(chars),
+        'favourite': lambda i, last_bot: favourite if rng.random() < 0.6 else rng.choice(chars),
+        'cycle': lambda i, last_bot: chars[i % len(chars)],
+        'copy bot': lambda i, last_bot: last_bot or favourite,
+    }
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    for move_set in (RPS, RPSLS):
+        rng = random.Random(1)
+        predictor = MovePredictor(max_models=users, seed=1)
+        habit_names = list(habits(move_set, rng))
+        players = [(user_id, habit_names[user_id % len(habit_names)], habits(move_set, rng)) for user_id in range(users)]
+        results = {name: [0, 0] for name in habit_names}
+
+        last_bot = {}
+        choose_time = observe_time = 0.0
+        for i in range(rounds):
+            for user_id, name, user_habits in players:
+                user_char = user_habits[name](i, last_bot.get(user_id))
+                start = time.perf_counter()
+                bot_char = predictor.choose(user_id, move_set)
+                middle = time.perf_counter()
+                predictor.observe(user_id, move_set, user_char)
+                observe_time += time.perf_counter() - middle
+                choose_time += middle - start
+                last_bot[user_id] = bot_char
+                results[name][0] += move_set.resolve(bot_char, user_char) == 1
+                results[name][1] += 1
+
+        # The models do not grow once they exist, so one move per user is enough to measure them
+        tracemalloc.start()
+        measured = MovePredictor(max_models=users)
+        for user_id in range(users):
+            measured.observe(user_id, move_set, move_set.chars[0])
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        calls = users * rounds
+        print('{0}: choose {1:.2f} us, observe {2:.2f} us per call ({3} users x {4} rounds)'.format(
+            move_set.name, 1e6 * choose_time / calls, 1e6 * observe_time / calls, users, rounds))
+        print('  model memory: {0:.0f} bytes per user traced, {1:.0f} estimated by memory()'.format(traced / users, measured.memory() / users))
+        print('  bot win rate: ' + ', '.join('{0} {1:.0%}'.format(name, wins / games) for name, (wins, games) in results.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Measures how fast the bot's on_raw_reaction_add turns a burst of reactions into results, through the in-process FakeDiscord
+--------------------
+Usage: python benchmarks/bench_reactions.py [games] [rest_latency_ms] [games_per_guild]
+Every game is set up by the real rps_start (server message, both DM prompts and their reactions) with Discord's global
+limit lifted, so the setup is quick. Once every prompt is ready, both players of every game react at the same time, and
+their reactions reach on_raw_reaction_add after the gateway latency, with the global limit back in place. Reports the
+p50/p99 latency from the last reaction of a game reaching the bot to its result showing up in the server message, how
+long on_raw_reaction_add took to return (it deletes the prompt before it does), and the REST calls made per reaction
+during the burst, per route.
+discord.py has to be installed; the bot is imported but never connects, and its databases go to a temporary directory.
+"""
+
+import asyncio, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_discord import GLOBAL_RATE, FakeBucket, FakeDiscord, bot_module, stop_bot
+from outcomes import RPS
+
+# Long enough that no countdown runs out before the burst
+TIME_LIMIT = 60
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(p * (len(values) - 1))] if values else 0.0
+
+
+def is_result(message):
+    return message.embed is not None and 'The results are' in message.embed.fields[0].value
+
+
+async def prompt_ready(server, member):
+    await server.wait_for(('dm', member.id), lambda: member.id in server.prompts and len(server.prompts[member.id].reactions) >= len(RPS.options))
+
+
+async def play_game(bot, server, game, players, rng, stats):
+    loop = asyncio.get_event_loop()
+    received = []
+
+    async def handler(payload):
+        received.append(loop.time())
+        start = loop.time()
+        await bot.on_raw_reaction_add(payload)
+        stats['handler'].append(loop.time() - start)
+
+    await asyncio.gather(*(server.react(player, server.prompts[player.id], RPS.char_to_full[rng.choice('rps')], handler) for player in players))
+    server_msg = server.messages[game.server_msg]
+    await server.wait_for(server_msg.id, lambda: is_result(server_msg))
+    stats['result'].append(loop.time() - max(received))
+
+
+async def run(bot, games, latency, games_per_guild):
+    server = FakeDiscord(latency=latency, global_rate=10**6)
+    server.attach(bot)
+    rng = random.Random(1)
+
+    matches = []
+    guild = None
+    for i in range(games):
+        if i % games_per_guild == 0:
+            guild = server.add_guild()
+        matches.append((guild, server.add_member(guild), server.add_member(guild)))
+    started = await asyncio.gather(*(bot.rps_start(guild.channel, host, opponent, TIME_LIMIT) for guild, host, opponent in matches))
+    await asyncio.gather(*(prompt_ready(server, member) for guild, host, opponent in matches for member in (host, opponent)))
+
+    server.global_bucket = FakeBucket(GLOBAL_RATE, 1.0)
+    calls, rate_limited = dict(server.calls), dict(server.rate_limited)
+    stats = {'result': [], 'handler': []}
+    await asyncio.gather(*(play_game(bot, server, game, (host, opponent), rng, stats) for game, (guild, host, opponent) in zip(started, matches)))
+    calls = {route: count - calls.get(route, 0) for route, count in server.calls.items() if count > calls.get(route, 0)}
+    rate_limited = {route: count - rate_limited.get(route, 0) for route, count in server.rate_limited.items()}
+
+    await stop_bot(bot)
+    return stats, calls, rate_limited
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    games_per_guild = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    with bot_module() as discordRPS:
+        stats, calls, rate_limited = asyncio.run(run(discordRPS, games, latency, games_per_guild))
+
+    reactions = 2 * games
+    print('{0} games, {1} per guild, {2} still active'.format(games, games_per_guild, len(discordRPS.game_manager.games)))
+    print('last reaction to result: p50 {0:.0f} ms, p99 {1:.0f} ms'.format(1000 * percentile(stats['result'], 0.5), 1000 * percentile(stats['result'], 0.99)))
+    print('on_raw_reaction_add, prompt deleted: p50 {0:.2f} ms, p99 {1:.2f} ms'.format(1000 * percentile(stats['handler'], 0.5), 1000 * percentile(stats['handler'], 0.99)))
+    print('REST calls per reaction: {0:.2f}'.format(sum(calls.values()) / reactions))
+    for route in sorted(calls):
+        print('  {0:<75} {1:6.2f}, {2} x 429'.format(route, calls[route] / reactions, rate_limited.get(route, 0)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Measures how long the bot's rps_resume takes to resume 10k journaled games after a restart
+--------------------
+Usage: python benchmarks/bench_resume.py [games] [rest_latency_ms]
+The journal is written by GameJournal in a temporary directory, as the bot would while the games are played:
+every game is created, gets its three messages, and half of the hosts have answered. rps_resume then loads it into a
+fresh GameManager, reattaches the messages and restarts the countdowns. Reattaching makes no REST calls (the messages
+are PartialMessages). Journals from before the names of the players were kept need every player fetched, so
+bot.fetch_user is replaced by one that takes rest_latency_ms and counts its calls; the older journal is only timed for a
+hundredth of the games.
+discord.py has to be installed; the bot is imported but never connects.
+"""
+
+import asyncio, json, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_discord import StubMessage, StubUser, bot_module
+from games import GameManager
+from snapshots import GameJournal
+
+
+async def write_journal(path, games, compact_every, names=True):
+    game_journal = GameJournal(path, compact_every=compact_every)
+    game_manager = GameManager()
+    now = time.time()
+    for i in range(games):
+        game = game_manager.create_game(StubUser(2 * i + 1), StubUser(2 * i + 2), 30, guild_id=i % 50)
+        game_journal.create(game)
+        game_journal.message(game, "server", StubMessage(10 * i, 1))
+        game_journal.message(game, "host", StubMessage(10 * i + 1, 10 * i + 1), now + 30)
+        game_journal.message(game, "opponent", StubMessage(10 * i + 2, 10 * i + 2), now + 30)
+        if i % 2:
+            game_journal.answer(game, "host", 'r')
+        if i % 1000 == 999:
+            await game_journal.flush()
+    await game_journal.close()
+
+    if not names:
+        # Journals from before names were kept end their create events at practice
+        with open(path) as journal:
+            events = [json.loads(line) for line in journal]
+        with open(path, 'w') as journal:
+            for event in events:
+                journal.write(json.dumps(event[:9] if event[0] == 'create' else event, separators=(',', ':')) + '\n')
+    return os.path.getsize(path) + (os.path.getsize(game_journal.snapshot_path) if os.path.exists(game_journal.snapshot_path) else 0)
+
+
+async def resume(bot, path, latency):
+    bot.game_manager = GameManager()
+    bot.game_journal = GameJournal(path)
+    fetched = [0]
+
+    async def fetch_user(user_id):
+        fetched[0] += 1
+        await asyncio.sleep(latency)
+        return StubUser(user_id)
+    bot.bot.fetch_user = fetch_user
+
+    start = time.perf_counter()
+    resumed = await bot.rps_resume()
+    elapsed = time.perf_counter() - start
+
+    bot.timer_wheel.stop()
+    for game in list(bot.game_manager.games.values()):
+        bot.timer_wheel.cancel(game.host_timer)
+        bot.timer_wheel.cancel(game.opponent_timer)
+    await bot.game_journal.close()
+    return elapsed, resumed, fetched[0]
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 80) / 1000
+
+    with bot_module() as discordRPS, tempfile.TemporaryDirectory() as tmp:
+        for name, count, compact_every, names in (('journal only', games, 10**9, True), ('snapshot', games, 1000, True),
+                                                   ('no names', max(1, games // 100), 10**9, False)):
+            path = os.path.join(tmp, name.replace(' ', '_') + '.journal')
+            size = asyncio.run(write_journal(path, count, compact_every, names))
+            elapsed, resumed, fetched = asyncio.run(resume(discordRPS, path, latency))
+            print('{0:>12}: {1} games ({2:.1f} KiB on disk) resumed in {3:.1f} ms, {4} users fetched'.format(name, resumed, size / 1024, 1000 * elapsed, fetched))
+
+
+if __name__ == '__main__':
+    main()
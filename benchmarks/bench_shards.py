@@ -0,0 +1,87 @@
+"""
+Measures how many !rps commands per second shard processes sustain as they scale from 1 to N on one machine
+--------------------
+Usage: python benchmarks/bench_shards.py [max_shards] [seconds] [handler_us]
+Every shard is a process with its own GameManager and a connection to one Coordinator (in this process).
+A command locks two random players through the coordinator, creates the game, spends handler_us of CPU like the
+rest of a command handler would, and then ends the game and unlocks its players. Each shard keeps 64 commands in flight.
+Busy players are refused, like on the bot. The coordinator is one process, so it caps the total rate.
+"""
+
+import asyncio, multiprocessing, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_discord import StubUser
+from games import GameManager
+from sharding import Coordinator, CoordinatorClient
+
+PLAYERS = 100000
+IN_FLIGHT = 64
+
+
+async def shard(shard_id, path, seconds, handler_us, results):
+    client = CoordinatorClient(shard_id)
+    await client.connect(path)
+    game_manager = GameManager()
+    rng = random.Random(shard_id)
+    deadline = time.perf_counter() + seconds
+    counts = [0, 0]
+
+    async def commands():
+        while time.perf_counter() < deadline:
+            host, opponent = StubUser(rng.randrange(PLAYERS)), StubUser(rng.randrange(PLAYERS))
+            if host.id == opponent.id or game_manager.is_playing(host) or game_manager.is_playing(opponent):
+                continue
+            match_id = await client.lock([host.id, opponent.id])
+            if match_id is None:
+                counts[1] += 1
+                continue
+            game = game_manager.create_game(host, opponent, 10, game_id=match_id)
+            end = time.perf_counter() + handler_us / 1e6
+            while time.perf_counter() < end:
+                pass
+            game_manager.resolve(game)
+            client.unlock(match_id)
+            counts[0] += 1
+
+    await asyncio.gather(*(commands() for i in range(IN_FLIGHT)))
+    await client.close()
+    results.put((shard_id, counts[0], counts[1]))
+
+
+def run_shard(shard_id, path, seconds, handler_us, results):
+    asyncio.run(shard(shard_id, path, seconds, handler_us, results))
+
+
+async def run(shards, seconds, handler_us, tmp):
+    coordinator = Coordinator(os.path.join(tmp, 'coordinator.sock'), os.path.join(tmp, 'match_ids'))
+    await coordinator.start()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_shard, args=(i, coordinator.path, seconds, handler_us, results)) for i in range(shards)]
+    for process in processes:
+        process.start()
+    loop = asyncio.get_event_loop()
+    # The coordinator runs on this loop, so the results are collected on a thread
+    counts = [await loop.run_in_executor(None, results.get) for process in processes]
+    for process in processes:
+        await loop.run_in_executor(None, process.join)
+    await coordinator.close()
+    return sum(count[1] for count in counts), sum(count[2] for count in counts), coordinator
+
+
+def main():
+    max_shards = int(sys.argv[1]) if len(sys.argv) > 1 else min(8, os.cpu_count() or 1)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    handler_us = float(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    shards = 1
+    while shards <= max_shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            done, refused, coordinator = asyncio.run(run(shards, seconds, handler_us, tmp))
+        print('{0} shards: {1:8.0f} commands/s, {2} refused because a player was busy, {3} players still locked'.format(
+            shards, done / seconds, refused, len(coordinator.players)))
+        shards *= 2
+
+
+if __name__ == '__main__':
+    main()
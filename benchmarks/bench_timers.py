@@ -0,0 +1,110 @@
+"""
+Compares event loop CPU time of the per-game countdown tasks against the shared TimerWheel
+--------------------
+Usage: python benchmarks/bench_timers.py [games] [seconds]
+Each game has two 1 second countdowns (host and opponent), like a real !rps game.
+The countdown edits are replaced by no-ops, so only the scheduling cost is measured. The old loop awaited its edit;
+the wheel callback works like rps_countdown: it only queues the edit, and returns a coroutine (which the wheel runs as
+a task) only once the player times out.
+"""
+
+import asyncio, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scheduler import TimerWheel
+
+
+class FakeGame:
+    def __init__(self, time):
+        self.host_counter = time
+        self.opponent_counter = time
+        self.host_timer = None
+        self.opponent_timer = None
+
+
+async def fake_edit(game, user_str):
+    pass
+
+
+def fake_queue_edit(game, user_str):
+    # rps_msg_edit only puts the edit on the EditQueue
+    pass
+
+
+async def fake_timeout(game, user_str):
+    pass
+
+
+async def per_task_countdown(game, user_str):
+    # The old do_stuff_every_x_seconds loop: one sleeping task per player per game
+    while True:
+        await asyncio.sleep(1)
+        if user_str == "host":
+            game.host_counter -= 1
+            counter = game.host_counter
+        else:
+            game.opponent_counter -= 1
+            counter = game.opponent_counter
+        await fake_edit(game, user_str)
+        if counter <= 0:
+            break
+
+
+def wheel_countdown(wheel, game, user_str):
+    if user_str == "host":
+        game.host_counter -= 1
+        counter = game.host_counter
+    else:
+        game.opponent_counter -= 1
+        counter = game.opponent_counter
+    if counter <= 0:
+        return fake_timeout(game, user_str)
+    timer = wheel.call_later(1, wheel_countdown, wheel, game, user_str)
+    if user_str == "host":
+        game.host_timer = timer
+    else:
+        game.opponent_timer = timer
+    fake_queue_edit(game, user_str)
+
+
+async def run_per_task(games, seconds):
+    tasks = []
+    for _ in range(games):
+        game = FakeGame(seconds + 5)
+        tasks.append(asyncio.create_task(per_task_countdown(game, "host")))
+        tasks.append(asyncio.create_task(per_task_countdown(game, "opponent")))
+    start = time.process_time()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return cpu, len(tasks)
+
+
+async def run_wheel(games, seconds):
+    wheel = TimerWheel()
+    for _ in range(games):
+        game = FakeGame(seconds + 5)
+        game.host_timer = wheel.call_later(1, wheel_countdown, wheel, game, "host")
+        game.opponent_timer = wheel.call_later(1, wheel_countdown, wheel, game, "opponent")
+    start = time.process_time()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - start
+    pending = wheel.pending()
+    wheel.stop()
+    return cpu, pending
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    cpu, tasks = asyncio.run(run_per_task(games, seconds))
+    print('per-task countdowns: {0} tasks, {1:.3f}s CPU over {2}s ({3:.1f}% of one core)'.format(tasks, cpu, seconds, 100 * cpu / seconds))
+    cpu, timers = asyncio.run(run_wheel(games, seconds))
+    print('timer wheel:         {0} timers, {1:.3f}s CPU over {2}s ({3:.1f}% of one core)'.format(timers, cpu, seconds, 100 * cpu / seconds))
+
+
+if __name__ == '__main__':
+    main()
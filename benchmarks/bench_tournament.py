@@ -0,0 +1,93 @@
+"""
+Measures how long each round of a tournament takes end to end, through the bot's rps_run_tournament and the in-process FakeDiscord
+--------------------
+Usage: python benchmarks/bench_tournament.py [players] [concurrency] [mode] [rest_latency_ms] [scale]
+Every match is set up by the real rps_start (server message, both DM prompts and their reactions) and indexed by
+GameManager.create_game. Players answer 1 to 8 seconds after their prompt is ready, and 5% of them let the 10 second
+limit run out. concurrency is TOURNAMENT_CONCURRENCY, the number of matches that may be set up at once.
+Time runs 1 / scale times faster than on Discord (100 times by default, run_scaled); the reported seconds are
+Discord time. Scale 1 runs in real time, which helps when a busy event loop makes the scaled times too slow.
+discord.py has to be installed; the bot is imported but never connects, and its databases go to a temporary directory.
+"""
+
+import asyncio, logging, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_discord import FakeDiscord, bot_module, run_scaled, stop_bot
+from outcomes import RPS
+
+TIME_LIMIT = 10
+
+
+class RoundTimes(logging.Handler):
+    """
+    Keeps the round times the bot logs once a tournament is over
+    """
+    def __init__(self):
+        super().__init__()
+        self.rounds = None
+
+    def emit(self, record):
+        if hasattr(record, 'round_seconds'):
+            self.rounds = record.round_seconds
+
+
+async def player(bot, server, member, rng):
+    # Answers every prompt the player gets, like the player of the load test
+    last = None
+    while True:
+        await server.wait_for(('dm', member.id), lambda: server.prompts.get(member.id) not in (None, last) and len(server.prompts[member.id].reactions) >= len(RPS.options))
+        last = server.prompts[member.id]
+        if rng.random() < 0.05:
+            continue
+        await asyncio.sleep(rng.uniform(1, 8))
+        await server.react(member, last, RPS.char_to_full[rng.choice('rps')], bot.on_raw_reaction_add)
+
+
+async def run(bot, players, mode, latency):
+    server = FakeDiscord(latency=latency)
+    server.attach(bot)
+    rng = random.Random(1)
+
+    guild = server.add_guild()
+    members = [server.add_member(guild) for i in range(players)]
+    bot.tournaments[guild.id] = {'mode': mode, 'time': TIME_LIMIT, 'channel': guild.channel, 'players': members, 'running': True}
+    answering = [asyncio.ensure_future(player(bot, server, member, rng)) for member in members]
+
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    await bot.rps_run_tournament(guild.id)
+    elapsed = loop.time() - start
+    for task in answering:
+        task.cancel()
+
+    await stop_bot(bot)
+    return server, elapsed
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'single'
+    latency = (float(sys.argv[4]) if len(sys.argv) > 4 else 80) / 1000
+    scale = float(sys.argv[5]) if len(sys.argv) > 5 else 0.01
+
+    with bot_module() as discordRPS:
+        discordRPS.TOURNAMENT_CONCURRENCY = concurrency
+        round_times = RoundTimes()
+        discordRPS.log.addHandler(round_times)
+        discordRPS.log.setLevel(logging.INFO)
+        start = time.perf_counter()
+        server, elapsed = run_scaled(run(discordRPS, players, mode, latency), scale)
+        wall = time.perf_counter() - start
+
+    for number, seconds in enumerate(round_times.rounds or [], 1):
+        print('Round {0:2d}: {1:6.1f}s'.format(number, seconds))
+    for route, count in sorted(server.rate_limited.items()):
+        print('429 responses of {0}: {1}'.format(route, count))
+    print('{0} players, concurrency {1}: {2:.1f}s ({3:.1f}s on the wall clock), {4} requests, {5} 429 responses, {6} games still active'.format(
+        players, concurrency, elapsed, wall, server.api_calls(), sum(server.rate_limited.values()), len(discordRPS.game_manager.games)))
+
+
+if __name__ == '__main__':
+    main()
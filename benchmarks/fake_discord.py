@@ -0,0 +1,423 @@
+"""
+In-process stand-in for Discord's REST API and gateway, for driving the bot's commands and events without a token
+--------------------
+FakeDiscord keeps guilds, members, channels (guild channels and DMs) and messages in memory. Every REST call of a
+fake object waits for the global bucket, then takes the configured latency and a token of its route's bucket. A request
+that finds its route's bucket empty gets a 429 and is retried after retry_after, like discord.py does. A share of the
+requests (error_rate) fails with a transient error instead: a 503 before anything was done, or a 500 or a timeout after
+the request went through, like the errors discord.py raises once its own retries are used up. Reactions of players are
+delivered to an event handler after the gateway latency, as a payload like the one of on_raw_reaction_add.
+bot_module() imports the bot for a benchmark, FakeDiscord.attach(bot) points it at the fake and stop_bot(bot) shuts it down.
+Benchmarks that only need GameManager use the StubUser and StubMessage objects instead. run_scaled(coro, scale) runs a
+benchmark on an event loop whose clock runs 1 / scale times faster than the wall clock, for the ones that would take hours.
+"""
+
+import asyncio, contextlib, itertools, os, random, selectors, sys, tempfile, time, types
+
+import discord
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Route -> (requests, per seconds) of its bucket. Buckets are kept per channel, like Discord's per-channel limits
+RATE_LIMITS = {
+    'POST /channels/{channel_id}/messages': (5, 5.0),
+    'PATCH /channels/{channel_id}/messages/{message_id}': (5, 5.0),
+    'DELETE /channels/{channel_id}/messages/{message_id}': (5, 1.0),
+    'PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me': (1, 0.25),
+    'POST /users/@me/channels': (50, 1.0),
+    'GET /guilds/{guild_id}/members/{user_id}': (10, 1.0),
+}
+GLOBAL_RATE = 50
+# Statuses of the transient errors, equally likely; None is a timeout
+TRANSIENT_ERRORS = (503, 500, None)
+
+
+class FakeHTTPException(discord.HTTPException):
+    """
+    Error response of the fake REST API, a discord.HTTPException like the bot gets from discord.py
+    --------------------
+    status: Integer HTTP status of the response
+    """
+    def __init__(self, status, text):
+        super().__init__(types.SimpleNamespace(status=status, reason=text), text)
+
+
+class FakeBucket:
+    """
+    Rate limit bucket of the fake REST API. Unlike edit_queue.RateLimitBucket it never waits; it answers if a request fits
+    """
+    def __init__(self, requests, per):
+        self.requests = requests
+        self.per = per
+        self.tokens = float(requests)
+        self.updated = None
+
+    def take(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.requests, self.tokens + (now - self.updated) * self.requests / self.per)
+        self.updated = now
+        if self.tokens < 1:
+            return (1 - self.tokens) * self.per / self.requests
+        self.tokens -= 1
+        return 0.0
+
+
+class FakeGuild:
+    def __init__(self, server, id):
+        self.server = server
+        self.id = id
+        self.name = 'Guild {0}'.format(id)
+        self.members = {}
+        self.channel = FakeChannel(server, server.new_id(), self)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id):
+        error = await self.server.request('GET /guilds/{guild_id}/members/{user_id}', self.id)
+        member = self.members.get(user_id)
+        if member is None:
+            raise FakeHTTPException(404, 'Unknown Member')
+        if error is not None:
+            raise error
+        return member
+
+
+class FakeMember:
+    """
+    Member of a FakeGuild. closed_dms makes sending a DM to the member fail like it does on Discord
+    """
+    def __init__(self, server, id, guild, bot=False, closed_dms=False):
+        self.server = server
+        self.id = id
+        self.guild = guild
+        self.name = 'Player{0}'.format(id)
+        self.mention = '<@{0}>'.format(id)
+        self.bot = bot
+        self.closed_dms = closed_dms
+        self.dm_channel = None
+
+    async def send(self, content=None, **kwargs):
+        if self.dm_channel is None:
+            error = await self.server.request('POST /users/@me/channels', None)
+            self.dm_channel = FakeChannel(self.server, self.server.new_id(), None, recipient=self)
+            if error is not None:
+                raise error
+        return await self.dm_channel.send(content, **kwargs)
+
+
+class FakeChannel:
+    def __init__(self, server, id, guild, recipient=None):
+        self.server = server
+        self.id = id
+        self.guild = guild
+        self.recipient = recipient
+        server.channels[id] = self
+
+    def get_partial_message(self, message_id):
+        # Like a PartialMessage, a message that is gone only fails once it is edited or deleted
+        message = self.server.messages.get(message_id)
+        if message is None:
+            message = FakeMessage(self.server, message_id, self, None, None)
+            message.deleted = True
+        return message
+
+    async def send(self, content=None, **kwargs):
+        error = await self.server.request('POST /channels/{channel_id}/messages', self.id)
+        if self.recipient is not None and self.recipient.closed_dms:
+            raise FakeHTTPException(403, 'Cannot send messages to this user')
+        message = FakeMessage(self.server, self.server.new_id(), self, content, kwargs.get('embed'))
+        self.server.messages[message.id] = message
+        if self.recipient is not None:
+            self.server.prompts[self.recipient.id] = message
+        self.server.notify(message)
+        if error is not None:
+            raise error
+        return message
+
+
+class FakeMessage:
+    """
+    Message kept by FakeDiscord
+    --------------------
+    embed: The embed of the latest send or edit
+    reactions: List of the emojis the bot added, in order
+    edits: Integer number of edits that were applied
+    deleted: Boolean that is True once the message was deleted
+    """
+    def __init__(self, server, id, channel, content, embed):
+        self.server = server
+        self.id = id
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.reactions = []
+        self.edits = 0
+        self.deleted = False
+
+    async def edit(self, **kwargs):
+        error = await self.server.request('PATCH /channels/{channel_id}/messages/{message_id}', self.channel.id)
+        self._check()
+        if 'embed' in kwargs:
+            self.embed = kwargs['embed']
+        if 'content' in kwargs:
+            self.content = kwargs['content']
+        self.edits += 1
+        self.server.notify(self)
+        if error is not None:
+            raise error
+
+    async def delete(self):
+        error = await self.server.request('DELETE /channels/{channel_id}/messages/{message_id}', self.channel.id)
+        self._check()
+        self.deleted = True
+        self.server.messages.pop(self.id, None)
+        if error is not None:
+            raise error
+
+    async def add_reaction(self, emoji):
+        error = await self.server.request('PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me', self.channel.id)
+        self._check()
+        self.reactions.append(str(emoji))
+        self.server.notify(self)
+        if error is not None:
+            raise error
+
+    def _check(self):
+        if self.deleted:
+            raise FakeHTTPException(404, 'Unknown Message')
+
+
+class FakePayload:
+    """
+    Payload of a raw reaction event, with the attributes on_raw_reaction_add reads
+    """
+    def __init__(self, message_id, user_id, emoji, channel_id=None, guild_id=None):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.emoji = emoji
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+
+
+class StubUser:
+    """
+    User with only the attributes GameManager reads, for benchmarks that do not go through FakeDiscord
+    """
+    __slots__ = ('id', 'name', 'guild')
+
+    def __init__(self, id, guild=None):
+        self.id = id
+        self.name = 'Player{0}'.format(id)
+        self.guild = guild
+
+
+class StubChannel:
+    __slots__ = ('id',)
+
+    def __init__(self, id):
+        self.id = id
+
+
+class StubMessage:
+    """
+    Message with only the attributes GameManager and GameJournal read
+    """
+    __slots__ = ('id', 'channel')
+
+    def __init__(self, id, channel_id):
+        self.id = id
+        self.channel = StubChannel(channel_id)
+
+
+@contextlib.contextmanager
+def bot_module():
+    """
+    Imports the bot (discordRPS) with its databases in a temporary directory and yields the module. discord.py has to be
+    installed; the bot never connects
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['RPS_HISTORY_DB'] = os.path.join(tmp, 'history.db')
+        os.environ['RPS_JOURNAL'] = os.path.join(tmp, 'games.journal')
+        import discordRPS
+        yield discordRPS
+
+
+async def stop_bot(bot):
+    """
+    Stops the timer wheel of the bot module and closes its databases
+    """
+    bot.timer_wheel.stop()
+    await bot.match_history.close()
+    await bot.game_journal.close()
+
+
+class ScaledSelector(selectors.DefaultSelector):
+    """
+    Selector that waits scale times as long as it is asked to
+    """
+    def __init__(self, scale):
+        super().__init__()
+        self.scale = scale
+
+    def select(self, timeout=None):
+        return super().select(None if timeout is None else timeout * self.scale)
+
+
+class ScaledEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose clock runs 1 / scale times faster than the wall clock. Everything that goes by loop.time() or
+    asyncio.sleep (the rate limits, latencies and countdowns) takes scale times as long on the wall clock.
+    Time spent on the CPU is scaled up as well, so a loop that is kept busy is slower than it would be on Discord
+    """
+    def __init__(self, scale):
+        self.scale = scale
+        self._origin = time.monotonic()
+        super().__init__(ScaledSelector(scale))
+
+    def time(self):
+        return self._origin + (time.monotonic() - self._origin) / self.scale
+
+
+def run_scaled(coro, scale):
+    """
+    Runs coro to completion on a new ScaledEventLoop and returns its result, like asyncio.run
+    """
+    loop = ScaledEventLoop(scale)
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class FakeDiscord:
+    """
+    Fake Discord that the bot's REST calls and gateway events go through
+    --------------------
+    latency: Float seconds every REST request takes, plus up to jitter seconds more
+    gateway_latency: Float seconds between a player's reaction and its event reaching the bot
+    global_rate: Integer requests per second of the global bucket
+    rate_limits: Dictionary of route -> (requests, per seconds), RATE_LIMITS by default
+    error_rate: Float share of the requests that fail with one of TRANSIENT_ERRORS
+    calls: Dictionary that has mappings of route and the number of requests that got an answer
+    rate_limited: Dictionary that has mappings of route and the number of 429 responses
+    errors: Dictionary that has mappings of route and the number of transient errors
+    bot_user: FakeMember that the bot is logged in as
+    METHODS
+    --------------------
+    attach(bot): Points the bot module at the fake: its user and channels
+    add_guild(): Creates a FakeGuild with one text channel
+    add_member(guild, **kwargs): Creates a FakeMember in guild
+    get_partial_messageable(channel_id): Returns the FakeChannel, like Client.get_partial_messageable
+    request(route, channel_id): Coroutine. Waits for the latency and the rate limits of route. Raises a 503, or returns the
+        error to raise once the request was carried out (None if it worked)
+    react(member, message, emoji, handler): Coroutine. Delivers a reaction of member to handler(payload) after the gateway latency
+    wait_for(key, predicate): Coroutine. Waits until predicate() is true. It is checked whenever the message with id key,
+        or for key ('dm', user_id) any DM to that user, is sent or changes
+    api_calls(): Returns the total number of requests that got an answer
+    """
+    def __init__(self, latency=0.05, jitter=0.02, gateway_latency=0.02, global_rate=GLOBAL_RATE, rate_limits=None, error_rate=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.gateway_latency = gateway_latency
+        self.global_bucket = FakeBucket(global_rate, 1.0)
+        self.rate_limits = RATE_LIMITS if rate_limits is None else rate_limits
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+        self.ids = itertools.count(1000)
+        self.guilds = {}
+        self.channels = {}
+        self.messages = {}
+        # user_id -> the latest DM the bot sent to that user
+        self.prompts = {}
+        self.buckets = {}
+        self.calls = {}
+        self.rate_limited = {}
+        self.errors = {}
+        # message id, or ('dm', user_id) for any DM to that user -> list of (predicate, future) of wait_for
+        self.waiters = {}
+        self.bot_user = FakeMember(self, self.new_id(), None, bot=True)
+
+    def new_id(self):
+        return next(self.ids)
+
+    def attach(self, bot):
+        # The bot never logs in, so it is given the user it would be logged in as, and the channels come from the fake
+        bot.bot._connection.user = self.bot_user
+        bot.bot.get_partial_messageable = self.get_partial_messageable
+
+    def add_guild(self):
+        guild = FakeGuild(self, self.new_id())
+        self.guilds[guild.id] = guild
+        return guild
+
+    def add_member(self, guild, **kwargs):
+        member = FakeMember(self, self.new_id(), guild, **kwargs)
+        guild.members[member.id] = member
+        return member
+
+    def get_partial_messageable(self, channel_id):
+        return self.channels[channel_id]
+
+    async def request(self, route, channel_id):
+        loop = asyncio.get_event_loop()
+        key = (route, channel_id)
+        if key not in self.buckets and route in self.rate_limits:
+            self.buckets[key] = FakeBucket(*self.rate_limits[route])
+        bucket = self.buckets.get(key)
+
+        while True:
+            # discord.py keeps track of the global limit itself, so it waits for it instead of getting a 429
+            wait = self.global_bucket.take(loop.time())
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            await asyncio.sleep(self.latency + self.rng.random() * self.jitter)
+            retry_after = bucket.take(loop.time()) if bucket is not None else 0.0
+            if not retry_after:
+                break
+            self.rate_limited[route] = self.rate_limited.get(route, 0) + 1
+            await asyncio.sleep(retry_after)
+        self.calls[route] = self.calls.get(route, 0) + 1
+
+        if not self.error_rate or self.rng.random() >= self.error_rate:
+            return None
+        self.errors[route] = self.errors.get(route, 0) + 1
+        status = self.rng.choice(TRANSIENT_ERRORS)
+        if status == 503:
+            raise FakeHTTPException(503, 'Service Unavailable')
+        # The request went through, but the bot only learns that it failed
+        return asyncio.TimeoutError() if status is None else FakeHTTPException(500, 'Internal Server Error')
+
+    async def react(self, member, message, emoji, handler):
+        await asyncio.sleep(self.gateway_latency)
+        guild_id = message.channel.guild.id if message.channel.guild is not None else None
+        await handler(FakePayload(message.id, member.id, emoji, message.channel.id, guild_id))
+
+    def notify(self, message):
+        keys = [message.id]
+        if message.channel.recipient is not None:
+            keys.append(('dm', message.channel.recipient.id))
+        for key in keys:
+            waiters = self.waiters.get(key)
+            if not waiters:
+                continue
+            for predicate, future in waiters:
+                if not future.done() and predicate():
+                    future.set_result(None)
+            waiters[:] = [(predicate, future) for predicate, future in waiters if not future.done()]
+            if not waiters:
+                del self.waiters[key]
+
+    async def wait_for(self, key, predicate):
+        if predicate():
+            return
+        future = asyncio.get_event_loop().create_future()
+        self.waiters.setdefault(key, []).append((predicate, future))
+        await future
+
+    def api_calls(self):
+        return sum(self.calls.values())
@@ -0,0 +1,161 @@
+"""
+End-to-end load test of the bot's !rps command and reaction handler against the in-process FakeDiscord
+--------------------
+Usage: python benchmarks/load_test.py [games] [rest_latency_ms] [timeout_percent] [forfeit_percent] [closed_dms_percent] [error_percent]
+Every game is started through the real rps() command, and its players react through on_raw_reaction_add. Each player
+either answers after 0.5 to 5 seconds, forfeits, or lets the 10 second limit run out. In closed_dms_percent of the games
+the opponent does not accept DMs, so the game has to be aborted. error_percent of the REST requests fail with a transient
+error (a 503, a 500 or a timeout), which the bot has to retry or give up on. Reports the p50/p99 latency
+from the last reaction of a game to its result showing up in the server message, the API calls per game
+(per route, with the 429 responses), the !rps command latency and the event loop lag.
+discord.py has to be installed; the bot is imported but never connects, and its databases go to a temporary directory.
+"""
+
+import asyncio, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_discord import FakeDiscord, bot_module, stop_bot
+from outcomes import RPS
+
+TIME_LIMIT = 10
+# Seconds a player waits for a prompt, and a game for its result, before giving up on it. All games start at once, so
+# the last prompts of a big run wait minutes for the global rate limit
+WAIT_LIMIT = 300
+GAMES_PER_GUILD = 5
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(p * (len(values) - 1))] if values else 0.0
+
+
+def is_result(message):
+    return message.embed is not None and 'The results are' in message.embed.fields[0].value
+
+
+def is_called_off(message):
+    return message.embed is not None and 'called off' in message.embed.fields[0].name
+
+
+async def lag_probe(lags, interval=0.01):
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+class FakeContext:
+    def __init__(self, author, guild, channel):
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+async def play(bot, server, member, behaviour, rng, reactions):
+    if behaviour == 'closed':
+        return
+    # Wait for the prompt and all of its options, like the prompt asks. A game whose setup failed never gets them
+    try:
+        await asyncio.wait_for(server.wait_for(('dm', member.id), lambda: member.id in server.prompts and len(server.prompts[member.id].reactions) >= len(RPS.options)), WAIT_LIMIT)
+    except asyncio.TimeoutError:
+        return
+    if behaviour == 'timeout':
+        return
+    await asyncio.sleep(rng.uniform(0.5, 5))
+    char = 'ff' if behaviour == 'forfeit' else rng.choice(['r', 's', 'p'])
+    reactions.append(asyncio.get_event_loop().time())
+    await server.react(member, server.prompts[member.id], RPS.char_to_full[char], bot.on_raw_reaction_add)
+
+
+async def play_game(bot, server, guild, host, opponent, behaviours, rng, stats):
+    loop = asyncio.get_event_loop()
+    reactions = []
+    start = loop.time()
+    players = asyncio.gather(play(bot, server, host, behaviours[0], rng, reactions), play(bot, server, opponent, behaviours[1], rng, reactions))
+    try:
+        await bot.rps.callback(FakeContext(host, guild, guild.channel), opponent.mention, TIME_LIMIT)
+    except Exception:
+        # The setup failed for good, and the game was aborted
+        players.cancel()
+        stats['failed'] += 1
+        return
+    stats['command'].append(loop.time() - start)
+
+    game = bot.game_manager.game_of(host.id)
+    await players
+    if 'closed' in behaviours:
+        # The game was aborted, and the players are free again
+        stats['aborted'] += game is None and not bot.game_manager.is_playing(host)
+        return
+    if game is None or game.server_msg is None:
+        stats['failed'] += 1
+        return
+    server_msg = server.messages[game.server_msg]
+    try:
+        await asyncio.wait_for(server.wait_for(server_msg.id, lambda: is_result(server_msg)), WAIT_LIMIT)
+    except asyncio.TimeoutError:
+        stats['no_result'] += 1
+        return
+    if 'timeout' not in behaviours and len(reactions) == 2:
+        stats['result'].append(loop.time() - max(reactions))
+
+
+async def run(bot, games, latency, timeout_share, forfeit_share, closed_share, error_share):
+    server = FakeDiscord(latency=latency, error_rate=error_share)
+    server.attach(bot)
+    rng = random.Random(1)
+
+    pairs = []
+    guild = None
+    for i in range(games):
+        if i % GAMES_PER_GUILD == 0:
+            guild = server.add_guild()
+        behaviours = []
+        for player in range(2):
+            roll = rng.random()
+            behaviours.append('timeout' if roll < timeout_share else 'forfeit' if roll < timeout_share + forfeit_share else 'answer')
+        if rng.random() < closed_share:
+            behaviours = ['closed', 'closed']
+        pairs.append((guild, server.add_member(guild), server.add_member(guild, closed_dms='closed' in behaviours), behaviours))
+
+    stats = {'command': [], 'result': [], 'failed': 0, 'no_result': 0, 'aborted': 0, 'closed': sum('closed' in pair[3] for pair in pairs)}
+    lags = []
+    probe = asyncio.ensure_future(lag_probe(lags))
+    await asyncio.gather(*(play_game(bot, server, guild, host, opponent, behaviours, rng, stats) for guild, host, opponent, behaviours in pairs))
+    probe.cancel()
+
+    await stop_bot(bot)
+    return server, stats, lags
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    timeout_share = (float(sys.argv[3]) if len(sys.argv) > 3 else 5) / 100
+    forfeit_share = (float(sys.argv[4]) if len(sys.argv) > 4 else 5) / 100
+    closed_share = (float(sys.argv[5]) if len(sys.argv) > 5 else 2) / 100
+    error_share = (float(sys.argv[6]) if len(sys.argv) > 6 else 0) / 100
+
+    with bot_module() as discordRPS:
+        server, stats, lags = asyncio.run(run(discordRPS, games, latency, timeout_share, forfeit_share, closed_share, error_share))
+
+    print('{0} games, {1} failed to start, {2} never showed a result, {3} still active, {4} of {5} games with closed DMs aborted ({6} players still indexed)'.format(
+        games, stats['failed'], stats['no_result'], len(discordRPS.game_manager.games), stats['aborted'], stats['closed'], len(discordRPS.game_manager.players)))
+    print('reaction to result: p50 {0:.0f} ms, p99 {1:.0f} ms ({2} games without a timeout)'.format(
+        1000 * percentile(stats['result'], 0.5), 1000 * percentile(stats['result'], 0.99), len(stats['result'])))
+    print('!rps until both prompts are ready: p50 {0:.0f} ms, p99 {1:.0f} ms'.format(1000 * percentile(stats['command'], 0.5), 1000 * percentile(stats['command'], 0.99)))
+    print('event loop lag: p99 {0:.1f} ms, max {1:.1f} ms'.format(1000 * percentile(lags, 0.99), 1000 * max(lags, default=0.0)))
+    print('API calls per game: {0:.1f}, 429 responses: {1}, transient errors: {2}'.format(server.api_calls() / games, sum(server.rate_limited.values()), sum(server.errors.values())))
+    for route in sorted(server.calls):
+        print('  {0:<75} {1:6.2f} per game, {2} x 429, {3} x error'.format(route, server.calls[route] / games, server.rate_limited.get(route, 0), server.errors.get(route, 0)))
+    print('edit queue: {0}'.format(discordRPS.edit_queue.stats()))
+    print('bot metrics: reaction to result p50 <= {0} s, p99 <= {1} s, {2} results counted'.format(
+        discordRPS.reaction_latency.quantile(0.5), discordRPS.reaction_latency.quantile(0.99), sum(sum(counts) for counts, total in discordRPS.reaction_latency.values.values())))
+
+
+if __name__ == '__main__':
+    main()
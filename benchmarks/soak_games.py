@@ -0,0 +1,109 @@
+"""
+Soak test of the game lifecycle: plays a million simulated matches through GameManager and reports memory and game counts
+--------------------
+Usage: python benchmarks/soak_games.py [matches] [matches_per_second] [sweep]
+Time is simulated (GameManager gets a fake clock), so a million matches take about a minute. Every simulated second starts
+matches_per_second matches. Most are set up in 1 to 3 seconds and resolved within their 10 second limit, but some go wrong like they do on Discord:
+4% fail their setup (a player does not accept DMs) and are aborted right away, 3% never finish their setup (a DM request
+that never returns), and 3% are never answered (a lost countdown). With sweep=1 (the default) the stuck games are aborted
+in bulk by a sweep every 10 seconds, like sweep_stuck_games does; sweep=0 shows how they pile up without it.
+"""
+
+import os, random, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fake_discord import StubMessage, StubUser
+from games import GameManager
+from memory_mode import rss_bytes
+
+TIME_LIMIT = 10
+SETUP_TIMEOUT = 120
+SWEEP_INTERVAL = 10
+SWEEP_GRACE = 30
+REPORTS = 10
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    sweep = (sys.argv[3] if len(sys.argv) > 3 else '1') == '1'
+
+    rng = random.Random(1)
+    clock = Clock()
+    game_manager = GameManager(SETUP_TIMEOUT, clock)
+    # second -> list of (action, game) to run at that simulated second
+    events = {}
+    counts = {'resolved': 0, 'setup failed': 0, 'swept': 0}
+    next_id = 1
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    started = 0
+    second = 0
+    print('{0:>9} {1:>8} {2:>7} {3:>8} {4:>8} {5:>8} {6:>8} {7:>8} {8:>8} {9:>11} {10:>9}'.format(
+        'matches', 'sim s', 'active', 'players', 'messages', 'heap', 'resolved', 'failed', 'swept', 'traced KiB', 'RSS MiB'))
+    while started < matches or game_manager.games:
+        clock.now = float(second)
+        for action, game in events.pop(second, ()):
+            if game.ended():
+                continue
+            if action == 'activate':
+                host_msg, opponent_msg = StubMessage(next_id, next_id), StubMessage(next_id + 1, next_id + 1)
+                next_id += 2
+                game_manager.track_message(game, host_msg, "host")
+                game_manager.track_message(game, opponent_msg, "opponent")
+                game_manager.activate(game)
+            elif action == 'resolve':
+                counts['resolved'] += game_manager.resolve(game)
+            elif action == 'fail':
+                counts['setup failed'] += game_manager.abort(game)
+
+        if sweep and second % SWEEP_INTERVAL == 0:
+            for game in game_manager.past_deadline(clock.now - SWEEP_GRACE):
+                counts['swept'] += game_manager.abort(game)
+
+        for i in range(min(rate, matches - started)):
+            host, opponent = StubUser(next_id), StubUser(next_id + 1)
+            game = game_manager.create_game(host, opponent, TIME_LIMIT)
+            game_manager.track_message(game, StubMessage(next_id + 2, 1), "server")
+            next_id += 3
+            setup = second + rng.randint(1, 3)
+            roll = rng.random()
+            if roll < 0.04:
+                events.setdefault(setup, []).append(('fail', game))
+            elif roll < 0.07:
+                pass
+            elif roll < 0.10:
+                events.setdefault(setup, []).append(('activate', game))
+            else:
+                events.setdefault(setup, []).append(('activate', game))
+                events.setdefault(setup + rng.randint(1, TIME_LIMIT), []).append(('resolve', game))
+            started += 1
+
+            if started % (matches // REPORTS) == 0:
+                print('{0:>9} {1:>8} {2:>7} {3:>8} {4:>8} {5:>8} {6:>8} {7:>8} {8:>8} {9:>11.0f} {10:>9.1f}'.format(
+                    started, second, len(game_manager.games), len(game_manager.players), len(game_manager.messages), len(game_manager.deadlines),
+                    counts['resolved'], counts['setup failed'], counts['swept'], tracemalloc.get_traced_memory()[0] / 1024, rss_bytes() / 2**20))
+        second += 1
+        if not sweep and started >= matches and not events:
+            # Nothing else will ever end the stuck games
+            break
+
+    elapsed = time.perf_counter() - start
+    print('done after {0} simulated seconds ({1:.1f}s): {2} games still active, {3} players and {4} messages still indexed, {5} heap entries'.format(
+        second, elapsed, len(game_manager.games), len(game_manager.players), len(game_manager.messages), len(game_manager.deadlines)))
+    game = game_manager.create_game(StubUser(0), StubUser(1), TIME_LIMIT)
+    print('a Game takes {0} bytes ({1} with its round_calls list), {2} bytes traced at the end'.format(
+        sys.getsizeof(game), sys.getsizeof(game) + sys.getsizeof(game.round_calls), tracemalloc.get_traced_memory()[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,260 +2,886 @@
 
 # https://discord.com/api/oauth2/authorize?client_id=808897152729743400&permissions=1073883200&scope=bot
 
-import discord, asyncio
+import discord, asyncio, collections, logging, os, re, time, types
 from discord.ext import commands, tasks
 from discord import Embed
 from asyncio import sleep
 
-### CLASSES
+from scheduler import TimerWheel
+from edit_queue import EditQueue, RateLimitBucket
+from games import GameManager
+from members import MemberCache, parse_user_id
+from memory_mode import bot_options, memory_report
+from history import MatchHistory
+from snapshots import GameJournal, remaining_time
+from outcomes import RPS, move_sets
+from matchmaking import MatchQueue, QueueEntry
+from tournament import Tournament
+from metrics import MetricsServer, RateLimitCounter, Registry, SamplingProfiler, instrument_http, loop_lag_probe
+from logs import setup_logging
+from sharding import CoordinatorClient, run_shards
+from predictor import MovePredictor
+
+STARTED_AT = time.monotonic()
 
-class Game:
+### GLOBAL VARS
+"""
+r   : rock option
+s   : scissors option
+p   : paper option
+ff  : forfeit option
+fft : forfeit from time limit
+Other variants (e.g. 'rpsls') add their own options; see outcomes.move_sets
+"""
+char_to_full = RPS.char_to_full
+
+# RPS_SHARDS=N runs N shard processes, each with its own GameManager, and a coordinator that keeps every player
+# in at most one game across them (see sharding.py). RPS_SHARD_ID is set for the shard processes
+SHARD_COUNT = int(os.environ.get('RPS_SHARDS', '1'))
+SHARD_ID = int(os.environ['RPS_SHARD_ID']) if 'RPS_SHARD_ID' in os.environ else None
+COORDINATOR_PATH = os.environ.get('RPS_COORDINATOR', 'rps_coordinator.sock')
+coordinator = None
+
+# A game has SETUP_TIMEOUT seconds to send its messages. Games still running SWEEP_GRACE seconds after their deadline
+# are stuck (e.g. a timer or an edit was lost) and are aborted by sweep_stuck_games every SWEEP_INTERVAL seconds
+SETUP_TIMEOUT = 120
+SWEEP_GRACE = 30
+SWEEP_INTERVAL = 10
+game_manager = GameManager(SETUP_TIMEOUT)
+timer_wheel = TimerWheel()
+edit_queue = EditQueue()
+match_history = MatchHistory(os.environ.get('RPS_HISTORY_DB', 'rps_history.db'))
+# Every shard journals its own games
+game_journal = GameJournal(os.environ.get('RPS_JOURNAL', 'rps_games.journal') + ('.{0}'.format(SHARD_ID) if SHARD_ID is not None else ''))
+# guild_id -> MatchQueue of the players waiting for a !queue opponent in that guild
+match_queues = {}
+# guild_id -> the open or running tournament of that guild: {'mode', 'time', 'channel', 'players', 'running'}
+tournaments = {}
+# At most TOURNAMENT_CONCURRENCY matches of one tournament are set up at once; any number of them can wait for answers
+TOURNAMENT_CONCURRENCY = 64
+
+# RPS_LOW_MEMORY=1 only requests the intents the games need and fetches members on demand
+LOW_MEMORY = os.environ.get('RPS_LOW_MEMORY', '0') == '1'
+# Move models of the players who practice against the bot (!practice or !rps @bot)
+predictor = MovePredictor(10000 if LOW_MEMORY else 100000)
+# Without member events, fetched members are fetched again after MEMBER_TTL seconds (e.g. once they left or were renamed)
+MEMBER_TTL = 600
+member_cache = MemberCache(ttl=MEMBER_TTL if LOW_MEMORY else None)
+
+bot_kwargs = bot_options(LOW_MEMORY)
+if SHARD_ID is not None:
+    bot_kwargs.update(shard_id=SHARD_ID, shard_count=SHARD_COUNT)
+bot = commands.Bot(command_prefix='!', **bot_kwargs)
+ready_reported = False
+
+# RPS_BUTTONS=1 sends one message with a button per option instead of adding four reactions
+USE_BUTTONS = os.environ.get('RPS_BUTTONS', '0') == '1'
+# At most SETUP_CONCURRENCY game setup requests are in flight; transient errors are retried SETUP_RETRIES times
+SETUP_CONCURRENCY = 16
+SETUP_RETRIES = 3
+setup_semaphore = None
+# Discord lets a bot post POST_CAPACITY messages to a channel at once and POST_RATE more every second after that.
+# channel id -> RateLimitBucket of the posts of the games, so that games set up at once in a channel wait for their turn
+POST_RATE = 1
+POST_CAPACITY = 5
+post_buckets = {}
+# Seconds from posting the server message until both DM prompts are ready, for the last games
+setup_latencies = collections.deque(maxlen=1000)
+# (round, API calls) of the last rounds played. Countdown refreshes are not counted, since every round makes the same ones
+round_api_calls = collections.deque(maxlen=1000)
+# Longest series that can be asked for with !rps @user 10 bo<N>
+MAX_BEST_OF = 9
+
+log = logging.getLogger('rps')
+# RPS_METRICS_PORT serves the metrics on http://127.0.0.1:<port>/metrics (0 turns it off); RPS_PROFILE=1 starts the profiler
+METRICS_PORT = int(os.environ.get('RPS_METRICS_PORT', '9108'))
+if METRICS_PORT and SHARD_ID is not None:
+    METRICS_PORT += SHARD_ID
+registry = Registry()
+profiler = SamplingProfiler()
+metrics_server = MetricsServer(registry, profiler)
+registry.gauge('rps_active_games', 'Games that are being played', lambda: len(game_manager.games))
+registry.gauge('rps_countdown_timers', 'Countdown timers pending on the timer wheel', timer_wheel.pending)
+registry.gauge('rps_edits_total', 'Message edits of the edit queue by what happened to them', lambda: {key: value for key, value in edit_queue.stats().items() if key != 'backlog'}, label='result', kind='counter')
+registry.gauge('rps_edit_backlog', 'Edits waiting in the edit queue', edit_queue.backlog)
+registry.gauge('rps_practice_models', 'Move models of practicing players kept in memory', lambda: len(predictor.models))
+rest_requests = registry.counter('rps_rest_requests_total', 'REST requests sent by route', label='route')
+rest_latency = registry.histogram('rps_rest_request_seconds', 'Latency of REST requests by route, including rate limit waits', label='route')
+rate_limited = registry.counter('rps_rest_rate_limited_total', '429 responses by method', label='method')
+reaction_latency = registry.histogram('rps_reaction_to_result_seconds', 'Seconds from the answer that finished a game to its result being shown')
+setup_latency = registry.histogram('rps_game_setup_seconds', 'Seconds from posting the server message of a game until its DM prompts are ready')
+registry.gauge('rps_queue_players_total', 'Players of the match queues by what happened to them', lambda: {
+    'enqueued': sum(match_queue.enqueued for match_queue in match_queues.values()),
+    'matched': sum(match_queue.matched for match_queue in match_queues.values()),
+    'evicted': sum(match_queue.evicted for match_queue in match_queues.values())}, label='event', kind='counter')
+registry.gauge('rps_queue_waiting', 'Players waiting in the match queues', lambda: sum(len(match_queue) for match_queue in match_queues.values()))
+queue_wait = registry.histogram('rps_queue_wait_seconds', 'Seconds a paired player waited in the match queue', buckets=(1, 5, 10, 30, 60, 120, 300))
+round_calls = registry.histogram('rps_round_api_calls', 'API calls of a game round, without countdown refreshes', buckets=(2, 4, 6, 8, 10, 12, 16, 24, 32), label='round')
+command_latency = registry.histogram('rps_command_seconds', 'Latency of the commands', label='command')
+loop_lag = registry.histogram('rps_event_loop_lag_seconds', 'How late the event loop wakes up from a sleep')
+games_aborted = registry.counter('rps_games_aborted_total', 'Games that were aborted by reason', label='reason')
+
+
+
+### FUNCTIONS
+
+def rps_test(a, b, move_set=RPS):
     """
-    Creates RPS Game object
-    --------------------
-    game_manager: GameManager object that manages this game
-    host: User object that hosted the RPS
-    opponent: User object that is assigned as the opponent of the RPS
-    time: Integer time in seconds
+    When given available RSP responses('r','s','p','ff','fft') a and b, decides who is the winner.
+    Returns 1 if a wins b, -1 if b wins a, and 0 if it is a tie.
     """
+    return move_set.resolve(a, b)
 
-    def __init__(self, game_manager, host, opponent, time):
-        self.game_manager = game_manager
-        self.time = time
-        self.id = 0
+def rps_countdown(game, user_str):
+    """
+    Timer wheel callback that runs every second for each player of a game.
+    user_str shows if the countdown is about the host or opponent
+    Counts the player's counter down and reschedules itself, or times the player out when the counter becomes zero.
+    """
+    if game.ended():
+        return
+    if user_str == "host":
+        game.host_counter -= 1
+        counter = game.host_counter
+    elif user_str == "opponent":
+        game.opponent_counter -= 1
+        counter = game.opponent_counter
+    else:
+        raise Exception('user_str was expected to be either "host" or "opponent", but it was neither')
+
+    if counter <= 0:
+        # If there was no response before time reaches 0, give a response of 'fft'
+        return rps_answer(game, user_str, 'fft')
+
+    if user_str == "host":
+        game.host_timer = timer_wheel.call_later(1, rps_countdown, game, user_str)
+    else:
+        game.opponent_timer = timer_wheel.call_later(1, rps_countdown, game, user_str)
 
-        self.host = host
-        self.host_response = None
-        self.host_counter = time
+    # Refresh the countdown less often when the edit budget is tight
+    if counter % edit_queue.refresh_interval() == 0:
+        rps_msg_edit(game, user_str)
 
-        self.opponent = opponent
-        self.opponent_response = None
-        self.opponent_counter = time
 
-        self.host_msg = None
-        self.opponent_msg = None
-        self.server_msg = None
+def rps_record(game):
+    """
+    Queues the finished game in match_history. Call it before the responses are cleared.
+    """
+    won = rps_test(game.host_response, game.opponent_response, game.move_set)
+    winner_id = None
+    if won == 1:
+        winner_id = game.host_id
+    elif won == -1:
+        winner_id = game.opponent_id
+
+    flag = None
+    if 'fft' in (game.host_response, game.opponent_response):
+        flag = 'timeout'
+    elif 'ff' in (game.host_response, game.opponent_response):
+        flag = 'forfeit'
 
-    def delete(self):
-        self.game_manager.games.pop(self.id)
+    match_history.record(game.guild_id, game.host_id, game.opponent_id, game.host_response, game.opponent_response, winner_id, flag, time.monotonic() - game.created_at)
 
 
-class GameManager:
+def rps_server_embed(game):
     """
-    Manages RPS Games
-    --------------------
-    games: Dictionary that has mappings of game_id(int) and Game(Game object)
-    next_id: Integer that is the next_id available as the game_id
-    METHODS
-    --------------------
-    increase_id(): Increases next_id by 1
-    is_playing(user): Checks if the user is in a RPS game.
-                      Returns a tuple of (1, "host") if the user is playing as a host, (1, "opponent") if the user is playing as an opponent, and (0, "nobody") if neither
+    Returns the embed of the server message: who is still being waited for, or the results once both players answered.
     """
-    def __init__(self):
-        self.games = {}
-        self.next_id = 0
+    embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    msg1 = 'Let a {0} game start between {1} and {2}!'.format(game.move_set.name.replace(' ', '-'), game.host_name, game.opponent_name)
+    series = ''
+    if game.best_of > 1:
+        msg1 = 'Let a best-of-{0} {1} series start between {2} and {3}!'.format(game.best_of, game.move_set.name.replace(' ', '-'), game.host_name, game.opponent_name)
+        series = 'Round {0}: {1} {2} - {3} {4}\n'.format(game.round, game.host_name, game.host_wins, game.opponent_wins, game.opponent_name)
+        if game.last_round is not None:
+            series += 'Last round: {0}{1} vs {2}{3}\n'.format(game.host_name, game.move_set.char_to_full[game.last_round[0]], game.move_set.char_to_full[game.last_round[1]], game.opponent_name)
+    if game.host_response == None:
+        msg2 = series + 'Waiting for response from {0}... '.format(game.host_mention())
+    elif game.opponent_response == None:
+        msg2 = series + 'Waiting for response from {0}... '.format(game.opponent_mention())
+    else:
+        # The edited message will be decided depending on which player won
+        host = '{0}({1})'.format(game.host_mention(), game.move_set.char_to_full[game.host_response])
+        opponent = '{0}({1})'.format(game.opponent_mention(), game.move_set.char_to_full[game.opponent_response])
+        won = rps_test(game.host_response, game.opponent_response, game.move_set)
+        msg2 = '\nThe results are:'
+        if won == 1:
+            msg2 += "\n\n{0} won {1}!\n\nWinner: {2}\nLoser: {3}".format(host, opponent, game.host_mention(), game.opponent_mention())
+        if won == 0:
+            msg2 += "\n\n{0} and {1} tied!\n\nIt's a tie!".format(host, opponent)
+        if won == -1:
+            msg2 += "\n\n{1} won {0}!\n\nWinner: {3}\nLoser: {2}".format(host, opponent, game.host_mention(), game.opponent_mention())
+        if game.best_of > 1:
+            series_won = rps_series_result(game)
+            if series_won == 1:
+                msg2 += "\n\n{0} won the series {1} - {2}!".format(game.host_mention(), game.host_wins, game.opponent_wins)
+            elif series_won == -1:
+                msg2 += "\n\n{0} won the series {1} - {2}!".format(game.opponent_mention(), game.opponent_wins, game.host_wins)
+            else:
+                msg2 += "\n\nThe series ended in a tie, {0} - {1}!".format(game.host_wins, game.opponent_wins)
+    embed.add_field(name=msg1, value=msg2, inline=True)
+    return embed
 
-    def increase_id(self):
-        self.next_id += 1
 
-    def create_game(self, host, opponent, time):
-        game = Game(self, host, opponent, time)
+def rps_series_result(game):
+    """
+    Returns 1 if host won the game (or series), -1 if opponent won it, and 0 if nobody did.
+    A player who forfeited a round of a series loses the series.
+    """
+    if game.last_round is not None and 'ff' in game.last_round:
+        return rps_test(game.last_round[0], game.last_round[1], game.move_set)
+    return (game.host_wins > game.opponent_wins) - (game.host_wins < game.opponent_wins)
 
-        # Assign game_id
-        game.id = self.next_id
-        self.increase_id()
 
-        self.games[game.id] = game
+def rps_score_round(game):
+    """
+    Records and scores the round both players answered. Returns True if the game is over: a single game always is,
+    a series is once a player won most of its rounds, forfeited, or both players timed out.
+    Practice games are not recorded; the player's move teaches the bot instead.
+    """
+    if game.practice:
+        predictor.observe(game.host_id, game.move_set, game.host_response)
+    else:
+        rps_record(game)
+    won = rps_test(game.host_response, game.opponent_response, game.move_set)
+    if won == 1:
+        game.host_wins += 1
+    elif won == -1:
+        game.opponent_wins += 1
+    else:
+        game.ties += 1
+    game.last_round = (game.host_response, game.opponent_response)
 
-        return game
+    if game.best_of == 1:
+        return True
+    if 2 * max(game.host_wins, game.opponent_wins) > game.best_of:
+        return True
+    if 'ff' in game.last_round or game.last_round == ('fft', 'fft'):
+        return True
+    # Ties do not count towards the series, but it cannot go on forever
+    return game.round >= 2 * game.best_of
 
-    def is_playing(self, user):
-        for game_id in self.games.keys():
-            game = self.games[game_id]
-            if game.host == user:
-                return 1
-            elif game.opponent == user:
-                return 1
-        return 0
 
+def rps_close_round(game):
+    """
+    Keeps the number of API calls the round made.
+    """
+    game.round_calls.append(game.api_calls)
+    round_api_calls.append((game.round, game.api_calls))
+    round_calls.observe(game.api_calls, 'first' if game.round == 1 else 'later')
+    game.api_calls = 0
 
 
-### GLOBAL VARS
-"""
-r   : rock option
-s   : scissors option
-p   : paper option
-ff  : forfeit option
-fft : forfeit from time limit
-"""
-char_to_full = {
-    'r':"✊",
-    's':"✌️",
-    'p':"🖐️",
-    'ff':"🏳️",
-    'fft':"⏲️"
-}
+def rps_next_round(game):
+    """
+    Starts the next round of a series. The DM prompts are edited in place instead of being sent again.
+    """
+    rps_close_round(game)
+    game.round += 1
+    game.host_response = None
+    game.opponent_response = None
+    game.host_counter = game.time
+    game.opponent_counter = game.time
+    game_manager.reset_deadline(game, time.monotonic() + game.time)
+    game_journal.next_round(game, time.time() + game.time)
+
+    edit_queue.edit(rps_message(game, "server"), embed=rps_server_embed(game))
+    rps_msg_edit(game, "host")
+    game.api_calls += 2
+    game.host_timer = timer_wheel.call_later(1, rps_countdown, game, "host")
+    if game.practice:
+        # Runs before any answer of the player can reach the bot
+        asyncio.ensure_future(rps_bot_answer(game))
+        return
+    rps_msg_edit(game, "opponent")
+    game.api_calls += 1
+    game.opponent_timer = timer_wheel.call_later(1, rps_countdown, game, "opponent")
 
-game_manager = GameManager()
 
-# intents = discord.Intents(messages=True, members=True)
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix='!', intents=intents)
+def rps_unlock(game):
+    """
+    Lets the players of a game that was taken down play on other shards again.
+    """
+    if coordinator is not None:
+        coordinator.unlock(game.id)
 
 
+def rps_message(game, user_str):
+    """
+    Returns a PartialMessage of the game's "host", "opponent" or "server" message, without fetching it.
+    Returns None if the message was not sent yet.
+    """
+    if user_str == "host":
+        message_id, channel_id = game.host_msg, game.host_channel
+    elif user_str == "opponent":
+        message_id, channel_id = game.opponent_msg, game.opponent_channel
+    else:
+        message_id, channel_id = game.server_msg, game.server_channel
+    if message_id is None:
+        return None
+    return bot.get_partial_messageable(channel_id).get_partial_message(message_id)
 
-### FUNCTIONS
 
-def rps_test(a, b):
+async def rps_delete(message):
     """
-    When given available RSP responses('r','s','p','ff','fft') a and b, decides who is the winner.
-    Returns 1 if a wins b, -1 if b wins a, and 0 if it is a tie.
+    Deletes a message of a game. The message may already be gone, so errors are ignored.
     """
-    if a[0] == b[0]:
-        return 0
-    if a == 'ff' or a == 'fft':
-        return -1
-    if b == 'ff' or b == 'fft':
-        return 1
-
-    if a == 'r':
-        if b == 's':
-            return 1
-        elif b == 'p':
-            return -1
-    elif a == 's':
-        if b == 'p':
-            return 1
-        elif b == 'r':
-            return -1
-    elif a == 'p':
-        if b == 'r':
-            return 1
-        elif b == 's':
-            return -1
+    edit_queue.discard(message)
+    try:
+        await message.delete()
+    except Exception:
+        pass
 
-# CHANGED
-async def do_stuff_every_x_seconds(timeout, func, game, user_str):
+
+def rps_end(game):
     """
-    Every x seconds, calls function func()
-    user_str shows if the func() is about the host or opponent
-    Modifies the messages when the counter becomes zero.
+    Ends the game once its last round was scored, and hands the result to whoever waits for it.
     """
+    rps_close_round(game)
+    game_manager.resolve(game)
+    game_journal.end(game)
+    rps_unlock(game)
+    if game.best_of > 1:
+        log.info('series over', extra={'game_id': game.id, 'rounds': game.round, 'round_calls': game.round_calls})
+    if game.on_result is not None:
+        game.on_result(game, rps_series_result(game))
 
-    while True:
-        # Every timeout seconds, calls func
-        await asyncio.sleep(timeout)
-        await func(game, user_str)
 
-        if user_str == "host" and game.host_counter <= 0:
-            # If there was no response before time reaches 0, give a response of 'fft'
-            try:
-                await game.host_msg.delete()
+def rps_abort(game, reason):
+    """
+    Takes down a game that cannot be finished: its setup failed, or it was stuck past its deadline.
+    The players are free again, the server message says that the game was called off and the DM prompts are deleted.
+    Whoever waits for the result gets a tie. Returns False if the game had already ended.
+    """
+    if not game_manager.abort(game):
+        return False
+    timer_wheel.cancel(game.host_timer)
+    timer_wheel.cancel(game.opponent_timer)
+    game_journal.end(game)
+    rps_unlock(game)
+    games_aborted.inc(reason)
+    log.info('game aborted', extra={'game_id': game.id, 'reason': reason, 'host_id': game.host_id, 'opponent_id': game.opponent_id})
+
+    server_msg = rps_message(game, "server")
+    if server_msg is not None:
+        embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+        msg1 = 'The game between {0} and {1} was called off'.format(game.host_name, game.opponent_name)
+        embed.add_field(name=msg1, value='Something went wrong with the game, so nobody won it', inline=True)
+        edit_queue.edit(server_msg, embed=embed)
+    for user_str in ("host", "opponent"):
+        message = rps_message(game, user_str)
+        if message is not None:
+            asyncio.ensure_future(rps_delete(message))
+
+    if game.on_result is not None:
+        game.on_result(game, 0)
+    return True
+
+
+async def rps_bot_answer(game):
+    """
+    Plays the bot's move in a practice game. The bot chooses before the player answers, from the model of the player's earlier moves.
+    """
+    await rps_answer(game, "opponent", predictor.choose(game.host_id, game.move_set))
 
-                game.host_response = 'fft'
 
-                # Edit the server_msg, depending on if the other player gave his response
-                embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                msg2 = ''
-                if game.opponent_response != None:
-                    msg2 = '\nThe results are:'
-                else:
-                    msg2 = 'Waiting for response from {0.mention}... '.format(game.opponent)
-                embed.add_field(name=msg1, value=msg2, inline=True)
-                await game.server_msg.edit(embed=embed)
-
-                if game.opponent_response != None:
-                    # Edit the server_msg, when the other player has answered
-                    embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                    msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                    msg2 = '\nThe results are:'
-
-                    # The edited message will be decided depending on which player won
-                    won = rps_test(game.host_response, game.opponent_response)
-                    if won == 1:
-                        msg2 += "\n\n{0}({2}) won {1}({3})!\n\nWinner: {0}\nLoser: {1}".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-                    if won == 0:
-                        msg2 += "\n\n{0}({2}) and {1}({3}) tied!\n\nIt's a tie!".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-                    if won == -1:
-                        msg2 += "\n\n{1}({3}) won {0}({2})!\n\nWinner: {1}\nLoser: {0}".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-
-                    embed.add_field(name=msg1, value=msg2, inline=True)
-                    await game.server_msg.edit(embed=embed)
-
-                    game.host_response = None
-                    game.opponent_response = None
-                    game.delete()
-            except Exception:
-                pass
-            break
-        elif user_str == "opponent" and game.opponent_counter <= 0:
-            # If there was no response before time reaches 0, give a response of 'fft'
-            try:
-                await game.opponent_msg.delete()
+async def rps_answer(game, user_str, response, received_at=None):
+    """
+    Records the response of a player, modifies the server message and deletes the player's DM message.
+    user_str shows if the response is from the host or opponent
+    response is one of the game's options, or 'fft'. A player can only answer once, so later calls do nothing
+    received_at is the time.perf_counter() value of when the answer reached the bot, if it came from the player
+    Answers to a game that already ended do nothing
+    """
+    if game.ended():
+        return
+    if user_str == "host":
+        if game.host_response != None:
+            return
+        game.host_response = response
+        timer = game.host_timer
+    elif user_str == "opponent":
+        if game.opponent_response != None:
+            return
+        game.opponent_response = response
+        timer = game.opponent_timer
+    else:
+        raise Exception('user_str was expected to be either "host" or "opponent", but it was neither')
+    game_journal.answer(game, user_str, response)
+    message = rps_message(game, user_str)
+
+    # Stop the countdown of the player who answered
+    timer_wheel.cancel(timer)
+    edit_queue.discard(message)
+
+    # Everything up to here runs without awaiting, so only one of the two answers can finish the round
+    finished = game.host_response != None and game.opponent_response != None
+    over = finished and rps_score_round(game)
+
+    # A series keeps both DM prompts for all of its rounds, and deletes them once it is over
+    if game.best_of == 1:
+        messages = [message]
+    elif over:
+        messages = [rps_message(game, "host"), rps_message(game, "opponent")]
+    else:
+        messages = []
+    messages = [message for message in messages if message is not None]
+    game.api_calls += len(messages)
 
-                game.opponent_response = 'fft'
+    if finished and not over:
+        rps_next_round(game)
+    else:
+        on_sent = None
+        if finished and received_at is not None:
+            on_sent = lambda: reaction_latency.observe(time.perf_counter() - received_at)
+        edit_queue.edit(rps_message(game, "server"), on_sent, embed=rps_server_embed(game))
+        game.api_calls += 1
+        if over:
+            rps_end(game)
 
-                # Edit the server_msg, depending on if the other player gave his response
-                embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                msg2 = ''
-                if game.host_response != None:
-                    msg2 = '\nThe results are:'
-                else:
-                    msg2 = 'Waiting for response from {0.mention}... '.format(game.host)
-                embed.add_field(name=msg1, value=msg2, inline=True)
-                await game.server_msg.edit(embed=embed)
-
-                if game.host_response != None:
-                    # Edit the server_msg, when the other player has answered
-                    embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                    msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                    msg2 = '\nThe results are:'
-
-                    # The edited message will be decided depending on which player won
-                    won = rps_test(game.opponent_response, game.host_response)
-                    if won == 1:
-                        msg2 += "\n\n{0}({2}) won {1}({3})!\n\nWinner: {0}\nLoser: {1}".format(game.opponent.mention, game.host.mention, char_to_full[game.opponent_response], char_to_full[game.host_response])
-                    if won == 0:
-                        msg2 += "\n\n{0}({2}) and {1}({3}) tied!\n\nIt's a tie!".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-                    if won == -1:
-                        msg2 += "\n\n{1}({3}) won {0}({2})!\n\nWinner: {1}\nLoser: {0}".format(game.opponent.mention, game.host.mention, char_to_full[game.opponent_response], char_to_full[game.host_response])
-
-                    embed.add_field(name=msg1, value=msg2, inline=True)
-                    await game.server_msg.edit(embed=embed)
-
-                    game.host_response = None
-                    game.opponent_response = None
-                    game.delete()
-            except Exception:
-                pass
-            break
+    for message in messages:
+        await rps_delete(message)
 
 
 
 # CHANGED
-async def rps_msg_edit(game, user_str):
+def rps_msg_edit(game, user_str):
+    """
+    Queues an edit of the player's DM message to show the current counter.
+    """
+    if user_str not in ("host", "opponent"):
+        raise Exception('user_str was expected to be either "host" or "opponent", but it was neither')
+    edit_queue.edit(rps_message(game, user_str), embed=rps_prompt_embed(game, user_str))
+
+
+def rps_prompt_embed(game, user_str):
+    """
+    Returns the embed of the player's DM message, with the player's counter and, in a series, the round and score.
+    """
     if user_str == "host":
-        game.host_counter -= 1
-        msg = "What will you play against {0}?   **{1}**\n(Don't give your response before the Bot gives you all of the options)".format(game.opponent.name, game.host_counter)
-        embed_host = discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description=msg, color=0x00ff00)
-        try:
-            await game.host_msg.edit(embed=embed_host)
-        except Exception:
-           pass
+        other, counter, wins, losses = game.opponent_name, game.host_counter, game.host_wins, game.opponent_wins
     elif user_str == "opponent":
-        game.opponent_counter -= 1
-        msg = "What will you play against {0}?   **{1}**\n(Don't give your response before the Bot gives you all of the options)".format(game.host.name, game.opponent_counter)
-        embed_opponent = discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description=msg, color=0x00ff00)
-        try:
-            await game.opponent_msg.edit(embed=embed_opponent)
-        except Exception:
-            pass
+        other, counter, wins, losses = game.host_name, game.opponent_counter, game.opponent_wins, game.host_wins
     else:
         raise Exception('user_str was expected to be either "host" or "opponent", but it was neither')
 
+    msg = "What will you play against {0}?   **{1}**\n(Don't give your response before the Bot gives you all of the options)".format(other, counter)
+    if game.best_of > 1:
+        msg += "\n\nRound {0} of a best of {1}, the score is {2} - {3} (you first)".format(game.round, game.best_of, wins, losses)
+        if game.round > 1 and not USE_BUTTONS:
+            # Bots cannot take back a player's reaction in a DM, so clicking the old one plays it as well
+            msg += "\n(Click any option to play it, even the one you chose last round)"
+    return discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description=msg, color=0x00ff00)
+
+
+async def rps_request(func, *args, idempotent=False, **kwargs):
+    """
+    Awaits func(*args, **kwargs), a REST request of a game setup, with at most SETUP_CONCURRENCY requests in flight.
+    Retries transient errors up to SETUP_RETRIES times. A request that fails with a 5xx response, a connection error or
+    a timeout may still have gone through, so only idempotent requests (e.g. adding a reaction) are retried after those.
+    Other requests (e.g. sending a message) are only retried after a 503 response, which shows that nothing was created.
+    """
+    global setup_semaphore
+    if setup_semaphore is None:
+        setup_semaphore = asyncio.Semaphore(SETUP_CONCURRENCY)
+
+    for attempt in range(SETUP_RETRIES + 1):
+        try:
+            async with setup_semaphore:
+                return await func(*args, **kwargs)
+        except discord.HTTPException as e:
+            if not (e.status == 503 or (idempotent and e.status >= 500)) or attempt == SETUP_RETRIES:
+                raise
+        except (OSError, asyncio.TimeoutError):
+            if not idempotent or attempt == SETUP_RETRIES:
+                raise
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def rps_post(channel, **kwargs):
+    """
+    Posts a message of a game or tournament to channel through rps_request, once the post bucket of channel allows it.
+    """
+    if channel.id not in post_buckets:
+        post_buckets[channel.id] = RateLimitBucket(POST_RATE, POST_CAPACITY)
+    await post_buckets[channel.id].acquire()
+    return await rps_request(channel.send, **kwargs)
+
+
+def rps_buttons(move_set):
+    """
+    Returns a View with a button per option of move_set. The View is stopped, so discord.py does not keep it around
+    for every message; the clicks are routed by on_interaction instead.
+    """
+    view = discord.ui.View(timeout=None)
+    for char in move_set.options:
+        view.add_item(discord.ui.Button(emoji=move_set.char_to_full[char], custom_id='rps:' + char, style=discord.ButtonStyle.secondary))
+    view.stop()
+    return view
+
+
+async def rps_prompt(game, user_str, player):
+    """
+    Sends the DM prompt to player, adds the options to it and starts the player's countdown once it is ready.
+    user_str shows if the prompt is for the host or opponent
+    The game moves on to AWAITING once every prompt of it is ready. If the game was aborted meanwhile, the prompt is taken back.
+    Players can answer as soon as the first option shows up, so the game may even be over before all of them are added.
+    """
+    embed = rps_prompt_embed(game, user_str)
+    game.api_calls += 1
+    if USE_BUTTONS:
+        message = await rps_request(player.send, embed=embed, view=rps_buttons(game.move_set))
+    else:
+        message = await rps_request(player.send, embed=embed)
+    if game.ended():
+        await rps_delete(message)
+        return
+    game_manager.track_message(game, message, user_str)
+    game_journal.message(game, user_str, message, time.time() + game.time)
+    if coordinator is not None and SHARD_ID != 0:
+        # Reactions in DMs only reach shard 0, which forwards them here
+        coordinator.route(game.id, message.id)
+
+    if not USE_BUTTONS:
+        # Reactions of one message share a rate limit and show up in the order they were added
+        for char in game.move_set.options:
+            if game.ended():
+                return
+            game.api_calls += 1
+            try:
+                await rps_request(message.add_reaction, game.move_set.char_to_full[char], idempotent=True)
+            except Exception:
+                # The game ended meanwhile and its prompt was deleted
+                if game.ended():
+                    return
+                raise
+    if game.ended():
+        return
+
+    # A player who already answered, or whose next round already started, needs no new countdown
+    if user_str == "host" and game.host_timer is None and game.host_response is None:
+        game.host_timer = timer_wheel.call_later(1, rps_countdown, game, user_str)
+    elif user_str == "opponent" and game.opponent_timer is None and game.opponent_response is None:
+        game.opponent_timer = timer_wheel.call_later(1, rps_countdown, game, user_str)
+    host_ready = game.host_timer is not None or game.host_response is not None
+    opponent_ready = game.practice or game.opponent_timer is not None or game.opponent_response is not None
+    if host_ready and opponent_ready:
+        game_manager.activate(game)
+
+
+async def rps_start(channel, host, opponent, s, variant='rps', on_result=None, best_of=1):
+    """
+    Starts a game (or a best_of series) between host and opponent with a time limit of s seconds per round, announced in channel.
+    on_result(game, won) is called once the game is over. Returns the Game, or None if one of the players is already in a game
+    (on this shard or another one). When opponent is the bot itself, the bot plays a practice game.
+    Raises ConnectionError if the coordinator of a sharded bot cannot be reached. If the setup fails (e.g. a player does not accept DMs), the game is aborted and the error is raised.
+    """
+    practice = opponent.id == bot.user.id
+    match_id = None
+    if coordinator is not None:
+        match_id = await coordinator.lock([host.id] if practice else [host.id, opponent.id])
+        if match_id is None:
+            return None
+    # Checked right before the game is created, with no await in between, since the players may have started
+    # another game since the command checked them
+    if game_manager.is_playing(host) or (not practice and game_manager.is_playing(opponent)):
+        if match_id is not None:
+            coordinator.unlock(match_id)
+        return None
+    game = game_manager.create_game(host, opponent, s, variant=variant, best_of=best_of, game_id=match_id, practice=practice)
+    game.on_result = on_result
+    game_journal.create(game)
+    try:
+        await rps_setup(game, channel, host, opponent)
+    except Exception:
+        rps_abort(game, 'setup failed')
+        raise
+    return game
+
+
+async def rps_setup(game, channel, host, opponent):
+    """
+    Posts the server message of a new game and sends the DM prompts.
+    """
+    # Post embed server message
+    embed=discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    msg1 = 'Let a {0} game start between {1.name} and {2.name}!'.format(game.move_set.name.replace(' ', '-'), host, opponent)
+    msg2 = 'Waiting for response from {0.mention}...\nWaiting for response from {1.mention}... '.format(host, opponent)
+    embed.add_field(name=msg1, value=msg2, inline=True)
+    game.api_calls += 1
+    server_msg = await rps_post(channel, embed=embed)
+    if game.ended():
+        await rps_delete(server_msg)
+        return
+    game_manager.track_message(game, server_msg, "server")
+    game_journal.message(game, "server", server_msg)
+
+    if game.practice:
+        await rps_bot_answer(game)
+        setup_start = time.monotonic()
+        await rps_prompt(game, "host", host)
+        setup_latencies.append(time.monotonic() - setup_start)
+        setup_latency.observe(setup_latencies[-1])
+        return
+
+    # Set up both players at the same time, so that neither countdown starts before its prompt is ready
+    setup_start = time.monotonic()
+    await asyncio.gather(rps_prompt(game, "host", host), rps_prompt(game, "opponent", opponent))
+    setup_latencies.append(time.monotonic() - setup_start)
+    setup_latency.observe(setup_latencies[-1])
+
+
+def rps_match_queue(guild_id):
+    """
+    Returns the MatchQueue of the guild, creating it the first time.
+    """
+    if guild_id not in match_queues:
+        match_queues[guild_id] = MatchQueue(game_manager.is_playing)
+    return match_queues[guild_id]
+
+
+async def rps_start_match(a, b):
+    """
+    Starts the game of two players paired by a MatchQueue. The player who waited longer hosts it, with their time limit.
+    """
+    host, opponent = (a, b) if a.joined <= b.joined else (b, a)
+    now = time.monotonic()
+    queue_wait.observe(now - host.joined)
+    queue_wait.observe(now - opponent.joined)
+    try:
+        if await rps_start(host.channel, host.member, opponent.member, host.time) is None:
+            log.info('queued players are in another game', extra={'host_id': host.member.id, 'opponent_id': opponent.member.id})
+    except Exception as e:
+        log.warning('could not start queued game', extra={'host_id': host.member.id, 'opponent_id': opponent.member.id, 'error': repr(e)})
+
+
+async def rps_tournament_match(channel, host, opponent, s):
+    """
+    Sets up one tournament match. Returns a future of its result once the match is set up: 1 if host won, -1 if opponent won
+    and 0 if nobody did. Returns the result itself if the match cannot start. A player who is still in another game forfeits the match.
+    """
+    host_busy, opponent_busy = game_manager.is_playing(host), game_manager.is_playing(opponent)
+    if host_busy or opponent_busy:
+        return opponent_busy - host_busy
+
+    result = asyncio.get_event_loop().create_future()
+    try:
+        if await rps_start(channel, host, opponent, s, on_result=lambda game, won: result.done() or result.set_result(won)) is None:
+            return 0
+    except Exception as e:
+        # rps_start already aborted the game, which set the result to a tie
+        log.warning('could not start tournament game', extra={'host_id': host.id, 'opponent_id': opponent.id, 'error': repr(e)})
+        return 0
+    return result
+
+
+async def rps_run_tournament(guild_id):
+    """
+    Runs the open tournament of the guild, announcing every round and the final standings in its channel.
+    """
+    state = tournaments[guild_id]
+    channel, s = state['channel'], state['time']
+
+    async def play_match(host, opponent):
+        return await rps_tournament_match(channel, host, opponent, s)
+
+    async def on_round(number, results):
+        lines = []
+        for host, opponent, winner in results:
+            if opponent is None:
+                lines.append('{0.name} has a bye'.format(host))
+            elif winner is None:
+                lines.append('{0.name} and {1.name} tied'.format(host, opponent))
+            else:
+                loser = opponent if winner == host else host
+                lines.append('{0.name} beat {1.name}'.format(winner, loser))
+        embed=discord.Embed(title="Rock Paper Scissors Tournament " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+        # An embed field holds at most 1024 characters, so big rounds only show how many matches were played
+        value = '\n'.join(lines)
+        if len(value) > 1024:
+            value = '{0} matches were played'.format(len(lines))
+        embed.add_field(name='Round {0} is over'.format(number), value=value, inline=True)
+        await rps_post(channel, embed=embed)
+
+    tournament = Tournament(state['players'], play_match, state['mode'], concurrency=TOURNAMENT_CONCURRENCY, on_round=on_round)
+    try:
+        standings = await tournament.run()
+    finally:
+        del tournaments[guild_id]
+
+    embed=discord.Embed(title="Rock Paper Scissors Tournament " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    lines = ['{0}. {1.mention}   {2:g} points'.format(rank, player, points) for rank, (player, points) in enumerate(standings[:10], 1)]
+    embed.add_field(name='{0.name} won the tournament!'.format(standings[0][0]), value='\n'.join(lines), inline=True)
+    await rps_post(channel, embed=embed)
+    log.info('tournament over', extra={'players': len(standings), 'round_seconds': [round(t, 1) for t in tournament.round_times]})
+
+
+def rps_reattach(message_state):
+    """
+    Returns a PartialMessage for a journaled message, without fetching it. Returns None if the message was never sent.
+    """
+    if 'message_id' not in message_state:
+        return None
+    return bot.get_partial_messageable(message_state['channel_id']).get_partial_message(message_state['message_id'])
+
+
+async def rps_resume_player(user_id, name):
+    """
+    Returns the player of a resumed game. A Game only keeps the id and name of its players, so the journaled name is enough;
+    the User is only fetched for games journaled before names were kept.
+    """
+    if name is not None:
+        return types.SimpleNamespace(id=user_id, name=name)
+    return bot.get_user(user_id) or await bot.fetch_user(user_id)
+
+
+async def rps_resume():
+    """
+    Resumes the games of game_journal after a restart. Each game is created again under a new id and reattached to its messages.
+    Players who ran out of time while the bot was down time out, the others get the rest of their countdown.
+    Returns the number of resumed games.
+    """
+    states = game_journal.load()
+    if states:
+        game_manager.next_id = max(game_manager.next_id, max(state['id'] for state in states) + 1)
+
+    now = time.time()
+    resumed = 0
+    for state in states:
+        game_journal.end_state(state['id'])
+        server_msg = rps_reattach(state['server'])
+        if server_msg is None:
+            # The bot stopped before the game was announced
+            continue
+        try:
+            host = await rps_resume_player(state['host_id'], state.get('host_name'))
+            opponent = await rps_resume_player(state['opponent_id'], state.get('opponent_name'))
+        except Exception:
+            continue
+        if game_manager.is_playing(host) or game_manager.is_playing(opponent):
+            continue
+        match_id = None
+        if coordinator is not None:
+            try:
+                match_id = await coordinator.lock([host.id] if state.get('practice') else [host.id, opponent.id])
+            except ConnectionError as e:
+                # Without a lock the players could be put in a game on another shard too, so the game is dropped
+                log.warning('could not resume game', extra={'game_id': state['id'], 'error': repr(e)})
+                continue
+            if match_id is None:
+                continue
+
+        game = game_manager.create_game(host, opponent, state['time'], state['guild_id'], state['variant'], state.get('best_of', 1), match_id, state.get('practice', False))
+        game_journal.create(game)
+        if state.get('round', 1) > 1:
+            game.round, game.host_wins, game.opponent_wins, game.ties = state['round'], state['host_wins'], state['opponent_wins'], state['ties']
+            game_journal.next_round(game, None)
+        game_manager.track_message(game, server_msg, "server")
+        game_journal.message(game, "server", server_msg)
+
+        for user_str in ("host", "opponent"):
+            player_state = state[user_str]
+            message = rps_reattach(player_state)
+            if message is not None:
+                game_manager.track_message(game, message, user_str)
+                game_journal.message(game, user_str, message, player_state['deadline'])
+                if coordinator is not None and SHARD_ID != 0:
+                    coordinator.route(game.id, message.id)
+            if user_str == "host":
+                game.host_counter = remaining_time(player_state, now)
+            else:
+                game.opponent_counter = remaining_time(player_state, now)
+
+            response = player_state.get('response')
+            if response is not None:
+                game_journal.answer(game, user_str, response)
+                if user_str == "host":
+                    game.host_response = response
+                else:
+                    game.opponent_response = response
+
+        # The prompts that were sent are ready again, and the others will never be
+        game_manager.activate(game)
+        for user_str in ("host", "opponent"):
+            if user_str == "host" and game.host_response == None:
+                counter, message_id = game.host_counter, game.host_msg
+            elif user_str == "opponent" and game.opponent_response == None:
+                counter, message_id = game.opponent_counter, game.opponent_msg
+            else:
+                continue
+
+            if user_str == "opponent" and game.practice:
+                await rps_bot_answer(game)
+            elif counter <= 0 or message_id is None:
+                await rps_answer(game, user_str, 'fft')
+            elif user_str == "host":
+                game.host_timer = timer_wheel.call_later(1, rps_countdown, game, user_str)
+            else:
+                game.opponent_timer = timer_wheel.call_later(1, rps_countdown, game, user_str)
+        resumed += 1
+
+    return resumed
+
+
+def rps_forward(event):
+    """
+    Discord only sends DM events to shard 0. Shard 0 forwards the events on DM prompts it does not know to the coordinator,
+    which hands them to the shard that owns the game.
+    """
+    if coordinator is not None and SHARD_ID == 0:
+        coordinator.forward(event)
+
+
+async def rps_forwarded(event):
+    """
+    Handles an event that shard 0 forwarded to this shard, like the event handler it came from.
+    """
+    if event['kind'] == 'add':
+        await on_raw_reaction_add(types.SimpleNamespace(message_id=event['message_id'], user_id=event['user_id'], emoji=event['emoji'], guild_id=None))
+    elif event['kind'] == 'remove':
+        await on_raw_reaction_remove(types.SimpleNamespace(message_id=event['message_id'], user_id=event['user_id'], emoji=event['emoji'], guild_id=None))
+    elif event['kind'] == 'button':
+        game, user_str = game_manager.route_reaction(event['message_id'], event['user_id'])
+        if game is not None and event['response'] in game.move_set.options:
+            await rps_answer(game, user_str, event['response'], time.perf_counter())
+
+
+def rps_live_matches():
+    """
+    Returns the games of this shard for the coordinator, which locks their players and routes their DM prompts again after a reconnect.
+    """
+    matches = []
+    for game in game_manager.games.values():
+        users = [game.host_id] if game.practice else [game.host_id, game.opponent_id]
+        messages = [message_id for message_id in (game.host_msg, game.opponent_msg) if message_id is not None] if SHARD_ID != 0 else []
+        matches.append({'match_id': game.id, 'users': users, 'messages': messages})
+    return matches
+
+
+async def rps_connect():
+    """
+    Connects a shard to the coordinator before the bot receives any event. Set as bot.setup_hook.
+    """
+    global coordinator
+    if SHARD_ID is not None:
+        coordinator = CoordinatorClient(SHARD_ID, rps_forwarded, rps_live_matches)
+        await coordinator.connect(COORDINATOR_PATH)
+
+bot.setup_hook = rps_connect
+
+
+def rps_start_metrics():
+    """
+    Starts counting REST calls and 429 responses, probing the event loop lag, and serving the metrics on METRICS_PORT.
+    """
+    instrument_http(bot.http, rest_requests, rest_latency)
+    logging.getLogger('discord.http').addHandler(RateLimitCounter(rate_limited))
+    asyncio.ensure_future(loop_lag_probe(loop_lag))
+    if os.environ.get('RPS_PROFILE', '0') == '1':
+        profiler.start()
+    if METRICS_PORT:
+        asyncio.ensure_future(metrics_server.start('127.0.0.1', METRICS_PORT))
+
 
 
 ### BOT COMMANDS
@@ -272,29 +898,35 @@ async def hello(ctx):
     await ctx.send(msg)
 
 @bot.command(pass_context=True, aliases=['rsp', 'prs', 'psr', 'srp', 'spr', 'play', 'game', 'battle'])
-async def rps(ctx, mention1, s=10):
+async def rps(ctx, mention1, s=10, *options):
     if ctx.author == bot.user:
         return
 
-    # Mapping user ids to Member objects, and getting opponent information
-    id_to_member = {}
-    print(ctx)
-    print(ctx.guild)
-    for member in ctx.guild.members:
-        id_to_member[str(member.id)] = member
-
-    mention1_user_id = ""
-    for c in mention1:
-        if '0'<=c and c<='9':
-            mention1_user_id += c
-
-
+    # The variant and the series length (e.g. bo5) can be given in any order after the time limit
+    variant = 'rps'
+    best_of = 1
+    for option in options:
+        match = re.fullmatch(r'bo(\d+)', option.lower())
+        if match is not None:
+            best_of = int(match.group(1))
+        else:
+            variant = option
+
+    # Getting opponent information
     host = ctx.author
-    opponent = id_to_member[mention1_user_id]
+    opponent = None
+    mention1_user_id = parse_user_id(mention1)
+    if ctx.guild is not None and mention1_user_id is not None:
+        opponent = await member_cache.resolve(ctx.guild, mention1_user_id)
 
     embed=discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
 
     # Cases that will not start a RPS
+    if opponent is None:
+        msg1 = 'Sorry, I could not find {0} in this server'.format(mention1)
+        embed.add_field(name=msg1, value='You can only battle members of this server', inline=True)
+        await ctx.send(embed=embed)
+        return
     if not (10 <= s):
         msg1 = 'Sorry, the time you selected was too short'
         embed.add_field(name=msg1, value='The time limit can only be between 10 and 60', inline=True)
@@ -305,14 +937,24 @@ async def rps(ctx, mention1, s=10):
         embed.add_field(name=msg1, value='The time limit can only be between 10 and 60', inline=True)
         await ctx.send(embed=embed)
         return
+    if variant not in move_sets:
+        msg1 = 'Sorry, {0} is not a variant I know'.format(variant)
+        embed.add_field(name=msg1, value='The variants are: ' + ', '.join(move_sets), inline=True)
+        await ctx.send(embed=embed)
+        return
+    if not (1 <= best_of <= MAX_BEST_OF and best_of % 2 == 1):
+        msg1 = 'Sorry, a series of {0} games is not allowed'.format(best_of)
+        embed.add_field(name=msg1, value='A series can be bo1, bo3, ... up to bo{0}'.format(MAX_BEST_OF), inline=True)
+        await ctx.send(embed=embed)
+        return
     if host == opponent:
         msg1 = 'Sorry, you cannot battle yourself'
         embed.add_field(name=msg1, value='You can only battle other players', inline=True)
         await ctx.send(embed=embed)
         return
-    if opponent.bot:
+    if opponent.bot and opponent.id != bot.user.id:
         msg1 = 'Sorry, you cannot battle a Bot'
-        embed.add_field(name=msg1, value='You can only battle other players', inline=True)
+        embed.add_field(name=msg1, value='You can only battle other players, or practice against me with !practice', inline=True)
         await ctx.send(embed=embed)
         return
     if game_manager.is_playing(host):
@@ -326,136 +968,341 @@ async def rps(ctx, mention1, s=10):
         await ctx.send(embed=embed)
         return
 
-    game = game_manager.create_game(host, opponent, s)
+    try:
+        game = await rps_start(ctx.channel, host, opponent, s, variant, best_of=best_of)
+    except ConnectionError as e:
+        # The coordinator of a sharded bot cannot be reached, so nobody can be locked for a game
+        log.warning('could not start game', extra={'host_id': host.id, 'opponent_id': opponent.id, 'error': repr(e)})
+        embed.add_field(name='Sorry, games cannot be started right now', value='Please try again in a minute', inline=True)
+        await ctx.send(embed=embed)
+        return
+    except Exception as e:
+        log.warning('could not start game', extra={'host_id': host.id, 'opponent_id': opponent.id, 'error': repr(e)})
+        msg1 = 'Sorry, the game between {0} and {1} could not be set up'.format(host.name, opponent.name)
+        embed.add_field(name=msg1, value='Both players need to accept direct messages from members of this server', inline=True)
+        await ctx.send(embed=embed)
+        return
+    if game is None:
+        msg1 = 'Sorry, {0} or {1} is currrently in another game'.format(host.name, opponent.name)
+        embed.add_field(name=msg1, value='You can only battle other players once you\'re both done with your matches', inline=True)
+        await ctx.send(embed=embed)
 
-    # Post embed server message
-    msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(host, opponent)
-    msg2 = 'Waiting for response from {0.mention}...\nWaiting for response from {1.mention}... '.format(host, opponent)
+
+@bot.command(aliases=['train'])
+async def practice(ctx, s=10, *options):
+    # A practice game is a game against the bot itself
+    await ctx.invoke(rps, bot.user.mention, s, *options)
+
+
+@bot.command(name='queue', aliases=['q', 'findmatch'])
+async def queue_command(ctx, s=10):
+    if ctx.author == bot.user:
+        return
+
+    embed=discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    if ctx.guild is None:
+        embed.add_field(name='Sorry, the queue only works in servers', value='Use !queue in a channel of your server', inline=True)
+        await ctx.send(embed=embed)
+        return
+    if not (10 <= s <= 60):
+        embed.add_field(name='Sorry, the time you selected was not allowed', value='The time limit can only be between 10 and 60', inline=True)
+        await ctx.send(embed=embed)
+        return
+    if game_manager.is_playing(ctx.author):
+        embed.add_field(name='Sorry, you are currrently in another game', value='You can only queue once you\'re done with your match', inline=True)
+        await ctx.send(embed=embed)
+        return
+
+    rating = await match_history.rating(ctx.guild.id, ctx.author.id)
+    # The player may have started another game while the rating was read
+    if game_manager.is_playing(ctx.author):
+        embed.add_field(name='Sorry, you are currrently in another game', value='You can only queue once you\'re done with your match', inline=True)
+        await ctx.send(embed=embed)
+        return
+    now = time.monotonic()
+    entry = QueueEntry(ctx.author, ctx.channel, rating, now, s)
+    partner = rps_match_queue(ctx.guild.id).add(entry, now)
+    if partner is None:
+        msg1 = '{0.name} joined the queue (rating {1:.0f})'.format(ctx.author, rating)
+        embed.add_field(name=msg1, value='Waiting for an opponent... Use !leave to leave the queue', inline=True)
+        await ctx.send(embed=embed)
+        return
+    await rps_start_match(entry, partner)
+
+@bot.command(aliases=['dequeue', 'unqueue'])
+async def leave(ctx):
+    if ctx.author == bot.user or ctx.guild is None:
+        return
+
+    embed=discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    if rps_match_queue(ctx.guild.id).remove(ctx.author.id):
+        embed.add_field(name='{0.name} left the queue'.format(ctx.author), value='Use !queue to join it again', inline=True)
+    else:
+        embed.add_field(name='{0.name} was not in the queue'.format(ctx.author), value='Use !queue to find an opponent', inline=True)
+    await ctx.send(embed=embed)
+
+@bot.command(aliases=['lb', 'top'])
+async def leaderboard(ctx):
+    if ctx.author == bot.user:
+        return
+
+    rows = await match_history.leaderboard(ctx.guild.id if ctx.guild is not None else 0)
+    embed=discord.Embed(title="Rock Paper Scissors Leaderboard " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    if not rows:
+        embed.add_field(name='Nobody has played yet', value='Start a game with !rps @user', inline=True)
+    else:
+        lines = []
+        for rank, (user_id, wins, losses, ties) in enumerate(rows, 1):
+            lines.append('{0}. <@{1}>   {2}W {3}L {4}T'.format(rank, user_id, wins, losses, ties))
+        embed.add_field(name='Most wins', value='\n'.join(lines), inline=True)
+    await ctx.send(embed=embed)
+
+@bot.command()
+async def stats(ctx, mention1=None):
+    if ctx.author == bot.user:
+        return
+
+    user_id = ctx.author.id
+    if mention1 is not None and parse_user_id(mention1) is not None:
+        user_id = parse_user_id(mention1)
+
+    wins, losses, ties = await match_history.stats(ctx.guild.id if ctx.guild is not None else 0, user_id)
+    embed=discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    msg1 = 'Rock-Paper-Scissors stats'
+    msg2 = '<@{0}>\nWins: {1}\nLosses: {2}\nTies: {3}\nGames: {4}'.format(user_id, wins, losses, ties, wins + losses + ties)
     embed.add_field(name=msg1, value=msg2, inline=True)
-    game.server_msg = await ctx.send(embed=embed)
-
-    msg = "What will you play against {0}?   **{1}**\n(Don't give your response before the Bot gives you all of the options)".format(opponent.name, s)
-    embed_host = discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description=msg, color=0x00ff00)
-    game.host_msg = await host.send(embed=embed_host)
-    await game.host_msg.add_reaction("✊")
-    await game.host_msg.add_reaction("✌️")
-    await game.host_msg.add_reaction("🖐️")
-    await game.host_msg.add_reaction("🏳️")
-    task = asyncio.create_task(do_stuff_every_x_seconds(1,rps_msg_edit,game,"host"))
-
-    msg = "What will you play against {0}?   **{1}**\n(Don't give your response before the Bot gives you all of the options)".format(host.name, s)
-    embed_opponent = discord.Embed(title="Rock Paper Scissors! " + "✊"+"✌️"+"🖐️", description=msg, color=0x00ff00)
-    game.opponent_msg = await opponent.send(embed=embed_opponent)
-    await game.opponent_msg.add_reaction("✊")
-    await game.opponent_msg.add_reaction("✌️")
-    await game.opponent_msg.add_reaction("🖐️")
-    await game.opponent_msg.add_reaction("🏳️")
-    task = asyncio.create_task(do_stuff_every_x_seconds(1,rps_msg_edit,game,"opponent"))
-
-
-    @bot.event
-    async def on_reaction_add(reaction, user):
-        channel = reaction.message.channel
-        message = reaction.message
-        player_response = ''
-
-        # Check for all of the reactions; look for a one that is not given by a bot
-        for reaction in message.reactions:
-            async for user in reaction.users():
-                if user != bot.user and (reaction.message == game.host_msg or reaction.message == game.opponent_msg):
-                    if reaction.emoji == "✊":
-                        player_response = 'r'
-                        print("{0} chose {1}.".format(user.name, player_response))
-                    elif reaction.emoji == "✌️":
-                        player_response = 's'
-                        print("{0} chose {1}.".format(user.name, player_response))
-                    elif reaction.emoji == "🖐️":
-                        player_response = 'p'
-                        print("{0} chose {1}.".format(user.name, player_response))
-                    elif reaction.emoji == "🏳️":
-                        player_response = 'ff'
-                        print("{0} chose {1}.".format(user.name, player_response))
-
-                    if user == game.host:
-                        game.host_response = player_response
-                    elif user == game.opponent:
-                        game.opponent_response = player_response
-
-                    await message.delete()
-
-
-                    if user == host:
-                        # Edit the server_msg, depending on if the other player gave his response
-                        embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                        msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                        msg2 = ''
-                        if game.opponent_response != None:
-                            msg2 = '\nThe results are:'
-                        else:
-                            msg2 = 'Waiting for response from {0.mention}... '.format(game.opponent)
-                        embed.add_field(name=msg1, value=msg2, inline=True)
-                        await game.server_msg.edit(embed=embed)
-
-                        if game.opponent_response != None:
-                            embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                            msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                            msg2 = '\nThe results are:'
-
-                            # The edited message will be decided depending on which player won
-                            won = rps_test(game.host_response, game.opponent_response)
-                            if won == 1:
-                                msg2 += "\n\n{0}({2}) won {1}({3})!\n\nWinner: {0}\nLoser: {1}".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-                            if won == 0:
-                                msg2 += "\n\n{0}({2}) and {1}({3}) tied!\n\nIt's a tie!".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-                            if won == -1:
-                                msg2 += "\n\n{1}({3}) won {0}({2})!\n\nWinner: {1}\nLoser: {0}".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-
-                            embed.add_field(name=msg1, value=msg2, inline=True)
-                            await game.server_msg.edit(embed=embed)
-
-                            game.host_response = None
-                            game.opponent_response = None
-                            game.delete()
-
-                    elif user == opponent:
-                        # Edit the server_msg, depending on if the other player gave his response
-                        embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                        msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                        msg2 = ''
-                        if game.host_response != None:
-                            msg2 = '\nThe results are:'
-                        else:
-                            msg2 = 'Waiting for response from {0.mention}... '.format(game.host)
-                        embed.add_field(name=msg1, value=msg2, inline=True)
-                        await game.server_msg.edit(embed=embed)
-
-                        if game.host_response != None:
-                            embed=discord.Embed(title="Rock Paper Scissors!"+ "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
-                            msg1 = 'Let a Rock-Paper-Scissors game start between {0.name} and {1.name}!'.format(game.host, game.opponent)
-                            msg2 = '\nThe results are:'
-
-                            # The edited message will be decided depending on which player won
-                            won = rps_test(game.opponent_response, game.host_response)
-                            if won == 1:
-                                msg2 += "\n\n{0}({2}) won {1}({3})!\n\nWinner: {0}\nLoser: {1}".format(game.opponent.mention, game.host.mention, char_to_full[game.opponent_response], char_to_full[game.host_response])
-                            if won == 0:
-                                msg2 += "\n\n{0}({2}) and {1}({3}) tied!\n\nIt's a tie!".format(game.host.mention, game.opponent.mention, char_to_full[game.host_response], char_to_full[game.opponent_response])
-                            if won == -1:
-                                msg2 += "\n\n{1}({3}) won {0}({2})!\n\nWinner: {1}\nLoser: {0}".format(game.opponent.mention, game.host.mention, char_to_full[game.opponent_response], char_to_full[game.host_response])
-
-                            embed.add_field(name=msg1, value=msg2, inline=True)
-                            await game.server_msg.edit(embed=embed)
-
-                            game.host_response = None
-                            game.opponent_response = None
-                            game.delete()
+    await ctx.send(embed=embed)
+
+@bot.command(aliases=['tourney'])
+async def tournament(ctx, action='open', mode='single', s=10):
+    if ctx.author == bot.user:
+        return
+
+    embed=discord.Embed(title="Rock Paper Scissors Tournament " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    if ctx.guild is None:
+        embed.add_field(name='Sorry, tournaments only work in servers', value='Use !tournament in a channel of your server', inline=True)
+        await ctx.send(embed=embed)
+        return
+    state = tournaments.get(ctx.guild.id)
+
+    if action == 'open':
+        if state is not None:
+            embed.add_field(name='Sorry, a tournament is already open in this server', value='Use !join to take part in it', inline=True)
+        elif mode not in ('single', 'swiss'):
+            embed.add_field(name='Sorry, {0} is not a tournament mode I know'.format(mode), value='The modes are: single, swiss', inline=True)
+        elif not (10 <= s <= 60):
+            embed.add_field(name='Sorry, the time you selected was not allowed', value='The time limit can only be between 10 and 60', inline=True)
+        else:
+            tournaments[ctx.guild.id] = {'mode': mode, 'time': s, 'channel': ctx.channel, 'players': [ctx.author], 'running': False}
+            msg1 = '{0.name} opened a {1} tournament!'.format(ctx.author, 'single elimination' if mode == 'single' else 'Swiss')
+            embed.add_field(name=msg1, value='Use !join to take part, and !tournament start to start it', inline=True)
+    elif action == 'start':
+        if state is None or state['running']:
+            embed.add_field(name='Sorry, there is no open tournament in this server', value='Use !tournament open to open one', inline=True)
+        elif len(state['players']) < 2:
+            embed.add_field(name='Sorry, a tournament needs at least 2 players', value='Use !join to take part', inline=True)
+        else:
+            state['running'] = True
+            msg1 = 'The tournament of {0} players starts now!'.format(len(state['players']))
+            embed.add_field(name=msg1, value='Every player gets a DM for each of their matches', inline=True)
+            asyncio.ensure_future(rps_run_tournament(ctx.guild.id))
+    else:
+        embed.add_field(name='Sorry, {0} is not something I can do with a tournament'.format(action), value='Use !tournament open [single|swiss] [time] or !tournament start', inline=True)
+    await ctx.send(embed=embed)
+
+@bot.command()
+async def join(ctx):
+    if ctx.author == bot.user or ctx.guild is None:
+        return
+
+    embed=discord.Embed(title="Rock Paper Scissors Tournament " + "✊"+"✌️"+"🖐️", description="", color=0x00ff00)
+    state = tournaments.get(ctx.guild.id)
+    if state is None or state['running']:
+        embed.add_field(name='Sorry, there is no open tournament in this server', value='Use !tournament open to open one', inline=True)
+    elif any(player.id == ctx.author.id for player in state['players']):
+        embed.add_field(name='{0.name} is already in the tournament'.format(ctx.author), value='Wait for !tournament start', inline=True)
+    else:
+        state['players'].append(ctx.author)
+        embed.add_field(name='{0.name} joined the tournament'.format(ctx.author), value='{0} players so far'.format(len(state['players'])), inline=True)
+    await ctx.send(embed=embed)
+
+
+@bot.event
+async def on_raw_reaction_add(payload):
+    """
+    Routes every reaction to its Game through the message index of game_manager,
+    so that a single handler serves all games without fetching who reacted.
+    """
+    received_at = time.perf_counter()
+    if payload.user_id == bot.user.id:
+        return
+
+    game, user_str = game_manager.route_reaction(payload.message_id, payload.user_id)
+    if game is None:
+        if payload.guild_id is None:
+            rps_forward({'kind': 'add', 'message_id': payload.message_id, 'user_id': payload.user_id, 'emoji': str(payload.emoji)})
+        return
+
+    player_response = game.move_set.full_to_char.get(str(payload.emoji))
+    if player_response not in game.move_set.options:
+        return
+    log.debug('answer', extra={'user_id': payload.user_id, 'response': player_response})
+
+    await rps_answer(game, user_str, player_response, received_at)
+
+@bot.event
+async def on_raw_reaction_remove(payload):
+    """
+    Bots cannot take back a player's reaction in a DM, so from the second round of a series on,
+    clicking the reaction a player left last round (which takes it back) plays that option.
+    """
+    received_at = time.perf_counter()
+    if payload.user_id == bot.user.id:
+        return
+
+    game, user_str = game_manager.route_reaction(payload.message_id, payload.user_id)
+    if game is None and payload.guild_id is None:
+        rps_forward({'kind': 'remove', 'message_id': payload.message_id, 'user_id': payload.user_id, 'emoji': str(payload.emoji)})
+    if game is None or game.round == 1:
+        return
+
+    player_response = game.move_set.full_to_char.get(str(payload.emoji))
+    if player_response not in game.move_set.options:
+        return
+    log.debug('answer', extra={'user_id': payload.user_id, 'response': player_response})
+
+    await rps_answer(game, user_str, player_response, received_at)
+
+@bot.event
+async def on_interaction(interaction):
+    """
+    Routes clicks on the option buttons (RPS_BUTTONS=1) to their Game, like on_raw_reaction_add does for reactions.
+    """
+    received_at = time.perf_counter()
+    custom_id = (interaction.data or {}).get('custom_id', '')
+    if interaction.message is None or not custom_id.startswith('rps:'):
+        return
+
+    game, user_str = game_manager.route_reaction(interaction.message.id, interaction.user.id)
+    await interaction.response.defer()
+    if game is None:
+        rps_forward({'kind': 'button', 'message_id': interaction.message.id, 'user_id': interaction.user.id, 'response': custom_id[len('rps:'):]})
+        return
+
+    player_response = custom_id[len('rps:'):]
+    if player_response not in game.move_set.options:
+        return
+    log.debug('answer', extra={'user_id': interaction.user.id, 'response': player_response})
+
+    await rps_answer(game, user_str, player_response, received_at)
+
+@bot.event
+async def on_member_join(member):
+    # Only members the guild does not cache itself need to be remembered
+    if member.guild.get_member(member.id) is None:
+        member_cache.remember(member)
+
+@bot.event
+async def on_member_update(before, after):
+    member_cache.update(after)
+
+@bot.event
+async def on_member_remove(member):
+    member_cache.forget(member.guild.id, member.id)
+    if member.guild.id in match_queues:
+        match_queues[member.guild.id].remove(member.id)
+
+@bot.event
+async def on_presence_update(before, after):
+    # Only sent with the presences intent; players who go offline leave the queue
+    if after.status == discord.Status.offline and after.guild.id in match_queues:
+        match_queues[after.guild.id].remove(after.id)
+
+@bot.before_invoke
+async def command_started(ctx):
+    ctx.started_at = time.perf_counter()
+
+@bot.after_invoke
+async def command_finished(ctx):
+    command_latency.observe(time.perf_counter() - ctx.started_at, ctx.command.qualified_name)
 
 @bot.event
 async def on_ready():
-    print('Logged in as')
-    print(bot.user.name)
-    print(bot.user.id)
-    print('------')
+    global ready_reported
+    log.info('logged in', extra={'user': bot.user.name, 'user_id': bot.user.id})
+
+    # on_ready runs again after every reconnect; startup is only reported once
+    if not ready_reported:
+        ready_reported = True
+        log.info('Ready in {0:.2f}s ({1} mode), {2}'.format(time.monotonic() - STARTED_AT, 'low-memory' if LOW_MEMORY else 'full cache', memory_report(len(bot.guilds))))
+        resume_start = time.monotonic()
+        try:
+            resumed = await rps_resume()
+            log.info('Resumed {0} games in {1:.2f}s'.format(resumed, time.monotonic() - resume_start))
+        except Exception as e:
+            # The background loops below have to run even if no game could be resumed
+            log.warning('could not resume games', extra={'error': repr(e)})
+        rps_start_metrics()
+        report_stats.start()
+        match_queued_players.start()
+        sweep_stuck_games.start()
+
+@tasks.loop(seconds=1)
+async def match_queued_players():
+    now = time.monotonic()
+    for match_queue in match_queues.values():
+        for a, b in match_queue.match_waiting(now):
+            asyncio.ensure_future(rps_start_match(a, b))
+        for entry in match_queue.expire(now):
+            asyncio.ensure_future(entry.channel.send('{0.mention}, nobody was found to play against, so you left the queue.'.format(entry.member)))
+
+@tasks.loop(seconds=SWEEP_INTERVAL)
+async def sweep_stuck_games():
+    # Every countdown ends before its game's deadline, so a game that is still there well after it is stuck
+    stuck = game_manager.past_deadline(time.monotonic() - SWEEP_GRACE)
+    for game in stuck:
+        rps_abort(game, 'stuck in ' + game.state)
+    if stuck:
+        log.warning('aborted stuck games', extra={'games': len(stuck)})
+    # Keep a post bucket only while it still limits its channel
+    for channel_id in [channel_id for channel_id, bucket in post_buckets.items() if bucket.load() == 0]:
+        del post_buckets[channel_id]
+
+@tasks.loop(minutes=10)
+async def report_stats():
+    log.info(memory_report(len(bot.guilds)))
+    if setup_latencies:
+        latencies = sorted(setup_latencies)
+        log.info('Game setup latency: p50 {0:.0f} ms, p99 {1:.0f} ms ({2} games)'.format(1000 * latencies[len(latencies) // 2], 1000 * latencies[int(0.99 * (len(latencies) - 1))], len(latencies)))
+    if match_queues:
+        waits = sorted(wait for match_queue in match_queues.values() for wait in match_queue.wait_times)
+        log.info('Queue: {0} waiting, {1} enqueued, {2} matched, {3} evicted'.format(
+            sum(len(match_queue) for match_queue in match_queues.values()), sum(match_queue.enqueued for match_queue in match_queues.values()),
+            sum(match_queue.matched for match_queue in match_queues.values()), sum(match_queue.evicted for match_queue in match_queues.values())))
+        if waits:
+            log.info('Queue wait: p50 {0:.1f}s, p99 {1:.1f}s ({2} players)'.format(waits[len(waits) // 2], waits[int(0.99 * (len(waits) - 1))], len(waits)))
+    if predictor.models:
+        log.info('Practice: {0} move models, {1:.1f} KiB, {2} evicted, {3} predictions'.format(len(predictor.models), predictor.memory() / 2**10, predictor.evictions, predictor.predictions))
+    first = [calls for number, calls in round_api_calls if number == 1]
+    later = [calls for number, calls in round_api_calls if number > 1]
+    if first:
+        log.info('API calls per round: {0:.1f} for a first round ({1} rounds), {2} for a later round of a series ({3} rounds)'.format(
+            sum(first) / len(first), len(first), '{0:.1f}'.format(sum(later) / len(later)) if later else '-', len(later)))
 
 TOKEN = 'private info'
-bot.run(TOKEN)
\ No newline at end of file
+
+
+def main():
+    """
+    Connects the bot to Discord. Importing this module does not, so that the commands and events can be driven by a fake Discord (see benchmarks/load_test.py).
+    """
+    setup_logging(logging.DEBUG if os.environ.get('RPS_DEBUG', '0') == '1' else logging.INFO)
+    if SHARD_COUNT > 1 and SHARD_ID is None:
+        # This process only runs the coordinator and starts a process for every shard
+        asyncio.run(run_shards(SHARD_COUNT, COORDINATOR_PATH))
+        return
+    bot.run(os.environ.get('RPS_TOKEN', TOKEN), log_handler=None)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import collections
+
+
+class RateLimitBucket:
+    """
+    Token bucket that mirrors one of Discord's rate limit buckets
+    --------------------
+    rate: Float number of requests that are refilled every second
+    capacity: Integer number of requests that can be sent in a burst
+    METHODS
+    --------------------
+    acquire(): Waits until a request can be sent, and takes it from the bucket
+    refund(): Gives back a request that was acquired but not sent
+    backoff(retry_after): Empties the bucket for retry_after seconds (after a 429 response)
+    load(): Returns how much of the bucket is used up, from 0.0 (full) to 1.0 (empty)
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = None
+
+    def _refill(self):
+        now = asyncio.get_event_loop().time()
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def backoff(self, retry_after):
+        self._refill()
+        self.tokens = -retry_after * self.rate
+
+    def load(self):
+        self._refill()
+        return 1 - max(0.0, self.tokens) / self.capacity
+
+
+class EditQueue:
+    """
+    Queue of message edits keyed by message. Only the latest edit of every message is kept,
+    so an edit that is superseded before it is sent is never sent at all.
+    --------------------
+    global_rate, global_capacity: Rate and burst of the bucket that is shared by every edit
+    channel_rate, channel_capacity: Rate and burst of the bucket of each channel
+    interval: Integer seconds between countdown refreshes when there is enough budget
+    slow_interval: Integer seconds between countdown refreshes when the budget is tight
+    requested, sent, coalesced, dropped, failed: Integer counters of edits
+    METHODS
+    --------------------
+    edit(message, on_sent, **kwargs): Queues message.edit(**kwargs), replacing the pending edit of message if there is one.
+                                      on_sent() is called once this edit was sent (not if it is replaced or dropped)
+    discard(message): Drops the pending edit of message (call it before the message is deleted)
+    refresh_interval(): Returns the number of seconds the countdowns should wait between refreshes
+    backlog(): Returns the number of edits waiting to be sent
+    stats(): Returns a dictionary of the counters
+    """
+    def __init__(self, global_rate=40, global_capacity=40, channel_rate=1, channel_capacity=5, interval=1, slow_interval=5):
+        self.global_bucket = RateLimitBucket(global_rate, global_capacity)
+        self.channel_rate = channel_rate
+        self.channel_capacity = channel_capacity
+        self.interval = interval
+        self.slow_interval = slow_interval
+
+        # message id -> (message, kwargs) of the latest edit that has not been sent
+        self.pending = {}
+        # channel id -> deque of message ids, in the order they were first queued
+        self.channels = {}
+        self.channel_buckets = {}
+        self.workers = {}
+
+        self.requested = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def edit(self, message, on_sent=None, **kwargs):
+        self.requested += 1
+        if message.id in self.pending:
+            self.coalesced += 1
+            self.pending[message.id] = (message, kwargs, on_sent)
+            return
+
+        self.pending[message.id] = (message, kwargs, on_sent)
+        channel_id = message.channel.id
+        if channel_id not in self.channels:
+            self.channels[channel_id] = collections.deque()
+        self.channels[channel_id].append(message.id)
+
+        if channel_id not in self.workers:
+            self.workers[channel_id] = asyncio.get_event_loop().create_task(self._drain(channel_id))
+
+    def discard(self, message):
+        if message is not None and self.pending.pop(message.id, None) is not None:
+            self.dropped += 1
+
+    def backlog(self):
+        return len(self.pending)
+
+    def refresh_interval(self):
+        # The budget is tight when the edits already waiting would take more than one refresh to send
+        if self.global_bucket.load() > 0.5 or self.backlog() > self.global_bucket.rate * self.interval:
+            return self.slow_interval
+        return self.interval
+
+    def stats(self):
+        return {
+            'requested': self.requested,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'backlog': self.backlog(),
+        }
+
+    def _channel_bucket(self, channel_id):
+        if channel_id not in self.channel_buckets:
+            self.channel_buckets[channel_id] = RateLimitBucket(self.channel_rate, self.channel_capacity)
+        return self.channel_buckets[channel_id]
+
+    async def _drain(self, channel_id):
+        queue = self.channels[channel_id]
+        bucket = self._channel_bucket(channel_id)
+        try:
+            while queue:
+                message_id = queue.popleft()
+                if message_id not in self.pending:
+                    continue
+
+                # Edits that arrive while waiting for the buckets replace the pending one
+                await bucket.acquire()
+                await self.global_bucket.acquire()
+                entry = self.pending.pop(message_id, None)
+                if entry is None:
+                    bucket.refund()
+                    self.global_bucket.refund()
+                    continue
+
+                message, kwargs, on_sent = entry
+                try:
+                    await message.edit(**kwargs)
+                    self.sent += 1
+                    if on_sent is not None:
+                        on_sent()
+                except Exception as e:
+                    self.failed += 1
+                    retry_after = getattr(e, 'retry_after', None)
+                    if getattr(e, 'status', None) == 429 and retry_after:
+                        bucket.backoff(retry_after)
+        finally:
+            self.workers.pop(channel_id, None)
+            if not queue:
+                self.channels.pop(channel_id, None)
+                # Keep a bucket only while it still limits the channel
+                if channel_id in self.channel_buckets and self.channel_buckets[channel_id].load() == 0:
+                    self.channel_buckets.pop(channel_id)
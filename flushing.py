@@ -0,0 +1,21 @@
+async def flush_forever(writer, wait, log, name):
+    """
+    Runs writer.flush() after every wait() until it is cancelled. writer keeps what it has not written in writer.pending
+    and counts the flushes that failed in writer.failed_writes. A failed flush does not end the loop: what it could not
+    write stays pending and is written once flush() works again. Only the first failure in a row is logged, and so is
+    the first flush that works after it.
+    name: String name of what writer writes, for the log
+    """
+    failing = False
+    while True:
+        await wait()
+        try:
+            await writer.flush()
+        except Exception as e:
+            if not failing:
+                log.warning('could not write ' + name, extra={'pending': len(writer.pending), 'error': repr(e)})
+            failing = True
+        else:
+            if failing:
+                log.info(name + ' is written again', extra={'failed_writes': writer.failed_writes})
+            failing = False
@@ -0,0 +1,287 @@
+import heapq
+import time as _time
+
+from outcomes import move_sets
+
+# States of a Game. A game is set up (server message and DM prompts sent), then waits for the players' answers,
+# and ends either resolved (its result was shown) or aborted (it could not be finished). Players can answer as soon as
+# their prompt shows its first option, so a game can also be resolved while it is still being set up
+SETUP = 'setup'
+AWAITING = 'awaiting'
+RESOLVED = 'resolved'
+ABORTED = 'aborted'
+# The states a Game can move to from each state. Ended games stay ended
+TRANSITIONS = {
+    SETUP: (AWAITING, RESOLVED, ABORTED),
+    AWAITING: (RESOLVED, ABORTED),
+    RESOLVED: (),
+    ABORTED: (),
+}
+
+
+class Game:
+    """
+    Creates RPS Game object. Games only keep the ids and names of their players and messages, so that an ended game
+    that is still referenced somewhere does not keep Member or Message objects alive
+    --------------------
+    game_manager: GameManager that creates the game (its clock and setup_timeout are used; the game keeps no reference to it)
+    state: SETUP, AWAITING, RESOLVED or ABORTED. Only GameManager changes it
+    host_id, host_name: Integer id and String name of the User that hosted the RPS
+    opponent_id, opponent_name: Integer id and String name of the User that is assigned as the opponent of the RPS
+    time: Integer time in seconds
+    guild_id: Integer id of the guild the game was started in (None if unknown)
+    variant: String key of the game's MoveSet in outcomes.move_sets ('rps' by default)
+    move_set: MoveSet of the game's variant
+    created_at: Float GameManager.clock() value of when the game was created
+    deadline: Float GameManager.clock() value by which the setup has to be done (SETUP), or after which both players have run out of time
+    host_msg, opponent_msg, server_msg: Integer ids of the DM prompts and the server message (None until they are sent)
+    host_channel, opponent_channel, server_channel: Integer ids of the channels of those messages
+    host_timer, opponent_timer: Timer objects of each player's countdown on the timer_wheel
+    on_result: Function on_result(game, won) called once the game is over (None if nobody waits for the result)
+    best_of: Integer number of rounds of the series (1 for a single game). The first player to win most of them wins the series
+    round: Integer number of the round being played, from 1
+    host_wins, opponent_wins, ties: Integer results of the rounds played so far
+    last_round: Tuple of (host_response, opponent_response) of the last finished round, or None
+    api_calls: Integer number of Discord API calls made for the current round
+    round_calls: List of the number of API calls of every finished round
+    practice: Boolean that is True when the opponent is the bot itself
+    METHODS
+    --------------------
+    host_mention(), opponent_mention(): Return the mention string of the player
+    ended(): Returns True once the game was resolved or aborted
+    """
+    __slots__ = ('state', 'id', 'time', 'guild_id', 'variant', 'move_set', 'created_at', 'deadline',
+                 'host_id', 'host_name', 'host_response', 'host_counter',
+                 'opponent_id', 'opponent_name', 'opponent_response', 'opponent_counter',
+                 'host_msg', 'opponent_msg', 'server_msg', 'host_channel', 'opponent_channel', 'server_channel',
+                 'host_timer', 'opponent_timer', 'on_result',
+                 'best_of', 'round', 'host_wins', 'opponent_wins', 'ties', 'last_round', 'api_calls', 'round_calls', 'practice')
+
+    def __init__(self, game_manager, host, opponent, time, guild_id=None, variant='rps', best_of=1, practice=False):
+        self.state = SETUP
+        self.time = time
+        self.id = 0
+        self.guild_id = guild_id
+        self.variant = variant
+        self.move_set = move_sets[variant]
+        self.created_at = game_manager.clock()
+        self.deadline = self.created_at + game_manager.setup_timeout
+
+        self.host_id = host.id
+        self.host_name = host.name
+        self.host_response = None
+        self.host_counter = time
+
+        self.opponent_id = opponent.id
+        self.opponent_name = opponent.name
+        self.opponent_response = None
+        self.opponent_counter = time
+
+        self.host_msg = None
+        self.opponent_msg = None
+        self.server_msg = None
+        self.host_channel = None
+        self.opponent_channel = None
+        self.server_channel = None
+
+        self.host_timer = None
+        self.opponent_timer = None
+        self.on_result = None
+
+        self.best_of = best_of
+        self.round = 1
+        self.host_wins = 0
+        self.opponent_wins = 0
+        self.ties = 0
+        self.last_round = None
+        self.api_calls = 0
+        self.round_calls = []
+        self.practice = practice
+
+    def host_mention(self):
+        return '<@{0}>'.format(self.host_id)
+
+    def opponent_mention(self):
+        return '<@{0}>'.format(self.opponent_id)
+
+    def ended(self):
+        return self.state == RESOLVED or self.state == ABORTED
+
+
+class GameManager:
+    """
+    Manages RPS Games and the moves between their states
+    --------------------
+    games: Dictionary that has mappings of game_id(int) and Game(Game object)
+    next_id: Integer that is the next_id available as the game_id
+    players: Dictionary that has mappings of user_id(int) and the game_id of the game the user is in
+    messages: Dictionary that has mappings of message_id(int) and a tuple of (game_id, "host"/"opponent"/"server")
+    guilds: Dictionary that has mappings of guild_id(int) and the set of game_ids started in that guild
+    deadlines: Heap of (deadline, game_id). Entries of removed games are dropped lazily
+    setup_timeout: Float seconds a game may spend in SETUP before its deadline passes
+    clock: Function that returns the current time (time.monotonic by default)
+    METHODS
+    --------------------
+    increase_id(): Increases next_id by 1
+    create_game(host, opponent, time, guild_id, variant, best_of, game_id, practice): Creates a Game in SETUP and indexes both players. guild_id defaults to the guild of host,
+                                                                   game_id to next_id (a sharded bot gets it from the coordinator).
+                                                                   The bot plays many practice games at once, so the opponent of one is not indexed
+    activate(game): Moves the game from SETUP to AWAITING once its prompts are ready; its deadline becomes clock() + game.time
+    resolve(game): Moves the game from SETUP or AWAITING to RESOLVED and removes it
+    abort(game): Moves the game from SETUP or AWAITING to ABORTED and removes it
+                 activate, resolve and abort return True if the game moved, and False if it could not (e.g. it already ended)
+    remove_game(game): Removes the game and every index entry that points to it. Does nothing if it was already removed
+    track_message(game, message, role): Keeps message as the "host", "opponent" or "server" message of game and indexes it
+    is_playing(user): Checks if the user is in a RPS game. Returns 1 if the user is playing, and 0 if not
+    game_of(user_id): Returns the Game that the user is in, or None
+    game_by_message(message_id): Returns a tuple of (Game, role) for an indexed message, or (None, None)
+    route_reaction(message_id, user_id): Returns a tuple of (Game, "host"/"opponent") if the message is the DM prompt of that user, or (None, None)
+    games_in_guild(guild_id): Returns a list of the Games started in the guild
+    reset_deadline(game, deadline): Moves the deadline of game to deadline (e.g. when the next round of a series starts)
+    past_deadline(now): Returns a list of the Games whose deadline is before now (clock() by default)
+    """
+    def __init__(self, setup_timeout=120, clock=_time.monotonic):
+        self.games = {}
+        self.next_id = 0
+        self.setup_timeout = setup_timeout
+        self.clock = clock
+
+        self.players = {}
+        self.messages = {}
+        self.guilds = {}
+        self.deadlines = []
+
+    def increase_id(self):
+        self.next_id += 1
+
+    def create_game(self, host, opponent, time, guild_id=None, variant='rps', best_of=1, game_id=None, practice=False):
+        if guild_id is None:
+            guild = getattr(host, 'guild', None)
+            guild_id = guild.id if guild is not None else None
+        game = Game(self, host, opponent, time, guild_id, variant, best_of, practice)
+
+        # Assign game_id
+        if game_id is None:
+            game.id = self.next_id
+            self.increase_id()
+        else:
+            game.id = game_id
+
+        self.games[game.id] = game
+        self.players[host.id] = game.id
+        if not practice:
+            self.players[opponent.id] = game.id
+        if game.guild_id is not None:
+            self.guilds.setdefault(game.guild_id, set()).add(game.id)
+        heapq.heappush(self.deadlines, (game.deadline, game.id))
+
+        return game
+
+    def _move(self, game, state):
+        if state not in TRANSITIONS[game.state]:
+            return False
+        game.state = state
+        return True
+
+    def activate(self, game):
+        if not self._move(game, AWAITING):
+            return False
+        self.reset_deadline(game, self.clock() + game.time)
+        return True
+
+    def resolve(self, game):
+        if not self._move(game, RESOLVED):
+            return False
+        self.remove_game(game)
+        return True
+
+    def abort(self, game):
+        if not self._move(game, ABORTED):
+            return False
+        self.remove_game(game)
+        return True
+
+    def remove_game(self, game):
+        if self.games.pop(game.id, None) is None:
+            return
+
+        for user_id in (game.host_id, game.opponent_id):
+            if self.players.get(user_id) == game.id:
+                del self.players[user_id]
+        for message_id in (game.host_msg, game.opponent_msg, game.server_msg):
+            if message_id is not None:
+                self.messages.pop(message_id, None)
+        if game.guild_id is not None:
+            guild_games = self.guilds.get(game.guild_id)
+            if guild_games is not None:
+                guild_games.discard(game.id)
+                if not guild_games:
+                    del self.guilds[game.guild_id]
+
+        # Rebuild the heap once most of its entries belong to removed games or to deadlines that were moved,
+        # keeping one entry per game
+        if len(self.deadlines) > 64 and len(self.deadlines) > 2 * len(self.games):
+            games = self.games
+            self.deadlines = [entry for entry in self.deadlines if entry[1] in games and games[entry[1]].deadline == entry[0]]
+            heapq.heapify(self.deadlines)
+
+    def track_message(self, game, message, role):
+        if role == "host":
+            game.host_msg, game.host_channel = message.id, message.channel.id
+        elif role == "opponent":
+            game.opponent_msg, game.opponent_channel = message.id, message.channel.id
+        else:
+            game.server_msg, game.server_channel = message.id, message.channel.id
+        self.messages[message.id] = (game.id, role)
+
+    def is_playing(self, user):
+        if user.id in self.players:
+            return 1
+        return 0
+
+    def game_of(self, user_id):
+        game_id = self.players.get(user_id)
+        if game_id is None:
+            return None
+        return self.games.get(game_id)
+
+    def game_by_message(self, message_id):
+        entry = self.messages.get(message_id)
+        if entry is None or entry[0] not in self.games:
+            return None, None
+        return self.games[entry[0]], entry[1]
+
+    def route_reaction(self, message_id, user_id):
+        game, role = self.game_by_message(message_id)
+        if role == "host" and game.host_id == user_id:
+            return game, role
+        if role == "opponent" and game.opponent_id == user_id:
+            return game, role
+        return None, None
+
+    def games_in_guild(self, guild_id):
+        return [self.games[game_id] for game_id in self.guilds.get(guild_id, ())]
+
+    def reset_deadline(self, game, deadline):
+        # The old entry no longer matches game.deadline, so past_deadline skips it
+        game.deadline = deadline
+        heapq.heappush(self.deadlines, (deadline, game.id))
+
+    def past_deadline(self, now=None):
+        if now is None:
+            now = self.clock()
+
+        # Walk only the part of the heap that is before now; every child of a later entry is later too
+        result = []
+        stack = [0]
+        heap = self.deadlines
+        while stack:
+            i = stack.pop()
+            if i >= len(heap) or heap[i][0] > now:
+                continue
+            game = self.games.get(heap[i][1])
+            if game is not None and game.deadline == heap[i][0]:
+                result.append(game)
+            stack.append(2 * i + 1)
+            stack.append(2 * i + 2)
+        return result
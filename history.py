@@ -0,0 +1,193 @@
+import asyncio
+import concurrent.futures
+import logging
+import sqlite3
+import time
+
+from flushing import flush_forever
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    host_id INTEGER NOT NULL,
+    opponent_id INTEGER NOT NULL,
+    host_move TEXT NOT NULL,
+    opponent_move TEXT NOT NULL,
+    winner_id INTEGER,
+    flag TEXT,
+    duration REAL NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    rating REAL NOT NULL DEFAULT 1000,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS players_leaderboard ON players (guild_id, wins DESC, losses);
+"""
+
+UPSERT_PLAYER = """
+INSERT INTO players (guild_id, user_id, wins, losses, ties, rating) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (guild_id, user_id) DO UPDATE SET
+    wins = wins + excluded.wins, losses = losses + excluded.losses, ties = ties + excluded.ties, rating = excluded.rating
+"""
+
+log = logging.getLogger('rps.history')
+
+INITIAL_RATING = 1000.0
+# How far one game can move an Elo rating
+ELO_K = 32
+
+
+def elo_update(rating_a, rating_b, score_a):
+    """
+    Returns the new Elo ratings of a and b, where score_a is 1 if a won, 0.5 for a tie and 0 if b won.
+    """
+    expected_a = 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+    change = ELO_K * (score_a - expected_a)
+    return rating_a + change, rating_b - change
+
+
+class MatchHistory:
+    """
+    Durable store of finished matches in SQLite (WAL mode), with win/loss/tie counts and Elo ratings per player
+    kept up to date in the same transaction as the matches. Matches are written in batches on a dedicated thread,
+    so the event loop never waits for the disk.
+    --------------------
+    path: String path of the SQLite database
+    batch_size: Integer number of pending matches that triggers a write before flush_interval has passed
+    flush_interval: Float seconds between writes of the pending matches
+    written: Integer number of matches written to the database
+    failed_writes: Integer number of writes that failed (e.g. the database was locked by another shard). Their matches are written again later
+    METHODS
+    --------------------
+    record(guild_id, host_id, opponent_id, host_move, opponent_move, winner_id, flag, duration): Queues a finished match
+    flush(): Coroutine. Writes every pending match. If the write fails, the matches stay pending and the error is raised
+    leaderboard(guild_id, limit): Coroutine. Returns a list of (user_id, wins, losses, ties) with the most wins first
+    stats(guild_id, user_id): Coroutine. Returns a tuple of (wins, losses, ties) of the player
+    rating(guild_id, user_id): Coroutine. Returns the Elo rating of the player (INITIAL_RATING for new players)
+    close(): Coroutine. Flushes and closes the database
+    """
+    def __init__(self, path='rps_history.db', batch_size=500, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed_writes = 0
+
+        self.pending = []
+        self._task = None
+        self._full = None
+        # One thread owns the connection, so every database call runs on it in order
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._conn = None
+
+    def _open(self):
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        # Databases from before ratings were kept get the column added
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(players)')]
+        if columns and 'rating' not in columns:
+            self._conn.execute('ALTER TABLE players ADD COLUMN rating REAL NOT NULL DEFAULT 1000')
+        self._conn.executescript(SCHEMA)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        if self._conn is None:
+            await loop.run_in_executor(self._executor, self._open)
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def record(self, guild_id, host_id, opponent_id, host_move, opponent_move, winner_id, flag, duration):
+        # Matches outside of a guild are kept under guild 0, since NULL keys would never conflict in the upsert
+        self.pending.append((guild_id or 0, host_id, opponent_id, host_move, opponent_move, winner_id, flag, duration, time.time()))
+        if self._task is None:
+            self._full = asyncio.Event()
+            self._task = asyncio.get_event_loop().create_task(flush_forever(self, self._wait, log, 'match history'))
+        if len(self.pending) >= self.batch_size:
+            self._full.set()
+
+    async def _wait(self):
+        # Until flush_interval has passed or batch_size matches are pending
+        try:
+            await asyncio.wait_for(self._full.wait(), self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._full.clear()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            await self._run(self._write, batch)
+        except Exception:
+            # The transaction was rolled back, so the whole batch is written again, before the newer matches
+            self.pending = batch + self.pending
+            self.failed_writes += 1
+            raise
+        self.written += len(batch)
+
+    def _write(self, batch):
+        # Other shards write to the same players, so the ratings are read in the write transaction: BEGIN IMMEDIATE
+        # takes the write lock before they are read, and nobody can change them until the new ones are committed.
+        # Sum the results of the batch per player, so each player's counts are updated once per batch.
+        # Ratings depend on the order of the matches, so they are replayed one match at a time
+        with self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            deltas = {}
+            for guild_id, host_id, opponent_id, host_move, opponent_move, winner_id, flag, duration, finished_at in batch:
+                for user_id in (host_id, opponent_id):
+                    if (guild_id, user_id) not in deltas:
+                        deltas[guild_id, user_id] = [0, 0, 0, self._rating(guild_id, user_id)]
+                    delta = deltas[guild_id, user_id]
+                    if winner_id is None:
+                        delta[2] += 1
+                    elif winner_id == user_id:
+                        delta[0] += 1
+                    else:
+                        delta[1] += 1
+
+                host, opponent = deltas[guild_id, host_id], deltas[guild_id, opponent_id]
+                score = 0.5 if winner_id is None else (1 if winner_id == host_id else 0)
+                host[3], opponent[3] = elo_update(host[3], opponent[3], score)
+
+            self._conn.executemany('INSERT INTO matches (guild_id, host_id, opponent_id, host_move, opponent_move, winner_id, flag, duration, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            self._conn.executemany(UPSERT_PLAYER, [key + tuple(delta) for key, delta in deltas.items()])
+
+    def _leaderboard(self, guild_id, limit):
+        return self._conn.execute('SELECT user_id, wins, losses, ties FROM players WHERE guild_id = ? ORDER BY wins DESC, losses LIMIT ?', (guild_id, limit)).fetchall()
+
+    def _rating(self, guild_id, user_id):
+        row = self._conn.execute('SELECT rating FROM players WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)).fetchone()
+        return row[0] if row is not None else INITIAL_RATING
+
+    def _stats(self, guild_id, user_id):
+        row = self._conn.execute('SELECT wins, losses, ties FROM players WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)).fetchone()
+        return row if row is not None else (0, 0, 0)
+
+    async def leaderboard(self, guild_id, limit=10):
+        return await self._run(self._leaderboard, guild_id, limit)
+
+    async def stats(self, guild_id, user_id):
+        return await self._run(self._stats, guild_id, user_id)
+
+    async def rating(self, guild_id, user_id):
+        return await self._run(self._rating, guild_id or 0, user_id)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown()
@@ -0,0 +1,152 @@
+import bisect
+import collections
+
+
+class QueueEntry:
+    """
+    A player waiting in a MatchQueue
+    --------------------
+    member: Member object of the player
+    channel: Channel the player queued from; the game is announced in the channel of the player who waited longer
+    rating: Float Elo rating of the player
+    joined: Float time.monotonic() value of when the player joined the queue
+    time: Integer time limit in seconds the player asked for
+    """
+    __slots__ = ('member', 'channel', 'rating', 'joined', 'time')
+
+    def __init__(self, member, channel, rating, joined, time):
+        self.member = member
+        self.channel = channel
+        self.rating = rating
+        self.joined = joined
+        self.time = time
+
+    def key(self):
+        return (self.rating, self.joined, self.member.id)
+
+
+class MatchQueue:
+    """
+    Matchmaking queue of one guild, ordered by rating. Two players are compatible when their ratings are within the
+    window of either of them; the window starts at base_window and widens by widen_rate every second a player waits.
+    --------------------
+    base_window: Float rating difference that is accepted right away
+    widen_rate: Float rating difference added to the window for every second of waiting
+    max_wait: Float seconds after which a player is taken out of the queue
+    is_playing: Function that returns 1 if a user is in a game. Players who started another game are taken out of the queue
+    keys: Sorted list of (rating, joined, user_id) of the waiting players
+    waiting: Dictionary that has mappings of user_id(int) and QueueEntry
+    enqueued, matched, evicted: Integer counters of players who joined, players who were paired, and players taken out without a game
+    wait_times: Deque of the seconds the last paired players waited
+    METHODS
+    --------------------
+    add(entry, now): Adds the player, or pairs them right away. Returns the QueueEntry of the partner, or None
+    remove(user_id): Takes the player out of the queue. Returns True if they were waiting
+    window(entry, now): Returns the rating window of a waiting player
+    match_waiting(now): Pairs the waiting players whose windows have widened enough. Returns a list of (QueueEntry, QueueEntry)
+    expire(now): Takes out the players who waited longer than max_wait. Returns their QueueEntries
+    """
+    def __init__(self, is_playing, base_window=50, widen_rate=10, max_wait=300):
+        self.is_playing = is_playing
+        self.base_window = base_window
+        self.widen_rate = widen_rate
+        self.max_wait = max_wait
+
+        self.keys = []
+        self.waiting = {}
+
+        self.enqueued = 0
+        self.matched = 0
+        self.evicted = 0
+        self.wait_times = collections.deque(maxlen=1000)
+
+    def __len__(self):
+        return len(self.waiting)
+
+    def window(self, entry, now):
+        return self.base_window + self.widen_rate * (now - entry.joined)
+
+    def _compatible(self, a, b, now):
+        return abs(a.rating - b.rating) <= max(self.window(a, now), self.window(b, now))
+
+    def _take(self, index, now, paired):
+        entry = self.waiting.pop(self.keys.pop(index)[2])
+        if paired:
+            self.matched += 1
+            self.wait_times.append(now - entry.joined)
+        return entry
+
+    def _neighbour(self, index, step, entry, now):
+        # Finds the closest player on one side that is still free, evicting the ones that started another game
+        while 0 <= index < len(self.keys):
+            candidate = self.waiting[self.keys[index][2]]
+            if not self.is_playing(candidate.member):
+                if self._compatible(entry, candidate, now):
+                    return index
+                return None
+            self._take(index, now, False)
+            self.evicted += 1
+            if step < 0:
+                index -= 1
+        return None
+
+    def add(self, entry, now):
+        self.enqueued += 1
+        self.remove(entry.member.id)
+
+        # Evicting players on the left shifts the right side, so look there once the left side is settled
+        left = self._neighbour(bisect.bisect_left(self.keys, entry.key()) - 1, -1, entry, now)
+        right = self._neighbour(bisect.bisect_left(self.keys, entry.key()), 1, entry, now)
+        if left is not None and right is not None:
+            if entry.rating - self.keys[left][0] <= self.keys[right][0] - entry.rating:
+                right = None
+            else:
+                left = None
+
+        partner = left if left is not None else right
+        if partner is None:
+            self.keys.insert(bisect.bisect_left(self.keys, entry.key()), entry.key())
+            self.waiting[entry.member.id] = entry
+            return None
+
+        self.matched += 1
+        self.wait_times.append(0.0)
+        return self._take(partner, now, True)
+
+    def remove(self, user_id):
+        entry = self.waiting.pop(user_id, None)
+        if entry is None:
+            return False
+        index = bisect.bisect_left(self.keys, entry.key())
+        del self.keys[index]
+        return True
+
+    def match_waiting(self, now):
+        # Neighbours in rating order are the closest possible partners, so pairing them greedily is enough
+        pairs = []
+        i = 0
+        while i + 1 < len(self.keys):
+            a = self.waiting[self.keys[i][2]]
+            b = self.waiting[self.keys[i + 1][2]]
+            if self.is_playing(a.member):
+                self._take(i, now, False)
+                self.evicted += 1
+                continue
+            if self.is_playing(b.member):
+                self._take(i + 1, now, False)
+                self.evicted += 1
+                continue
+            if self._compatible(a, b, now):
+                second = self._take(i + 1, now, True)
+                first = self._take(i, now, True)
+                pairs.append((first, second))
+            else:
+                i += 1
+        return pairs
+
+    def expire(self, now):
+        expired = [entry for entry in self.waiting.values() if now - entry.joined > self.max_wait]
+        for entry in expired:
+            self.remove(entry.member.id)
+            self.evicted += 1
+        return expired
@@ -0,0 +1,91 @@
+import collections
+import re
+import time as _time
+
+MENTION_ID = re.compile(r'\d+')
+
+
+def parse_user_id(mention):
+    """
+    Returns the user id(int) in a mention like '<@123>' or '<@!123>', or in a plain id. Returns None if there is none.
+    """
+    match = MENTION_ID.search(mention)
+    if match is None:
+        return None
+    return int(match.group())
+
+
+class MemberCache:
+    """
+    Resolves guild members by id without building a mapping of the whole guild.
+    Members in the guild's own member cache (kept up to date by the gateway's join/leave/update events)
+    are found in O(1) through guild.get_member. Members that are not cached are fetched on demand
+    and kept in a LRU cache of fetched members.
+    --------------------
+    size: Integer maximum number of fetched members kept in the LRU cache
+    ttl: Float seconds a fetched member is used before it is fetched again, or None to keep it until it is evicted.
+         Without the members intent (low-memory mode) no member events arrive, so a fetched member is never updated or forgotten
+    clock: Function that returns the current time (time.monotonic by default)
+    fetched: OrderedDict that has mappings of (guild_id, user_id) and a tuple of (Member, time it was fetched), least recently used first
+    hits, misses, fetches: Integer counters of lookups answered from a cache, lookups that needed a fetch, and fetches sent
+    METHODS
+    --------------------
+    get(guild, user_id): Returns the Member from the guild cache or the LRU cache, or None
+    resolve(guild, user_id): Coroutine. Returns get(), or fetches the member. Returns None if the user is not a member
+    remember(member): Puts a member in the LRU cache (e.g. from on_member_join)
+    update(member): Replaces a member that is in the LRU cache (from on_member_update)
+    forget(guild_id, user_id): Removes a member from the LRU cache (from on_member_remove)
+    """
+    def __init__(self, size=10000, ttl=None, clock=_time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.fetched = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def get(self, guild, user_id):
+        member = guild.get_member(user_id)
+        if member is None:
+            key = (guild.id, user_id)
+            entry = self.fetched.get(key)
+            if entry is None:
+                return None
+            member, fetched_at = entry
+            if self.ttl is not None and self.clock() - fetched_at > self.ttl:
+                del self.fetched[key]
+                return None
+            self.fetched.move_to_end(key)
+        self.hits += 1
+        return member
+
+    async def resolve(self, guild, user_id):
+        member = self.get(guild, user_id)
+        if member is not None:
+            return member
+
+        self.misses += 1
+        self.fetches += 1
+        try:
+            member = await guild.fetch_member(user_id)
+        except Exception:
+            return None
+        self.remember(member)
+        return member
+
+    def remember(self, member):
+        key = (member.guild.id, member.id)
+        self.fetched[key] = (member, self.clock())
+        self.fetched.move_to_end(key)
+        while len(self.fetched) > self.size:
+            self.fetched.popitem(last=False)
+
+    def update(self, member):
+        key = (member.guild.id, member.id)
+        if key in self.fetched:
+            self.fetched[key] = (member, self.clock())
+
+    def forget(self, guild_id, user_id):
+        self.fetched.pop((guild_id, user_id), None)
@@ -0,0 +1,50 @@
+import resource
+
+import discord
+
+
+def bot_options(low_memory):
+    """
+    Returns the keyword arguments for commands.Bot.
+    With low_memory, only the gateway intents the RPS games need are requested, and members,
+    presences and messages are not cached. Members are then fetched on demand by the MemberCache.
+    """
+    if not low_memory:
+        return {'intents': discord.Intents.all()}
+
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.dm_reactions = True
+    if hasattr(intents, 'message_content'):
+        intents.message_content = True
+
+    return {
+        'intents': intents,
+        'member_cache_flags': discord.MemberCacheFlags.none(),
+        'chunk_guilds_at_startup': False,
+        'max_messages': None,
+    }
+
+
+def rss_bytes():
+    """
+    Returns the resident set size of the process in bytes. Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if peak > 1 << 32 else peak * 1024
+
+
+def memory_report(guild_count):
+    """
+    Returns a line with the RSS of the process and the RSS per guild.
+    """
+    rss = rss_bytes()
+    per_guild = rss / guild_count if guild_count else 0
+    return 'RSS {0:.1f} MiB, {1} guilds, {2:.1f} KiB per guild'.format(rss / 2**20, guild_count, per_guild / 2**10)
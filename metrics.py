@@ -0,0 +1,315 @@
+import asyncio
+import bisect
+import collections
+import logging
+import sys
+import threading
+import time
+
+# Upper bounds in seconds of the histogram buckets, from a fast event handler up to a backed-up edit queue
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _labels(label, value):
+    if label is None:
+        return ''
+    return '{{{0}="{1}"}}'.format(label, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+
+
+class Counter:
+    """
+    Counter that only goes up, optionally split by the value of one label
+    --------------------
+    name, help: Strings shown in the Prometheus text format
+    label: String name of the label, or None
+    values: Dictionary that has mappings of the label value (None without a label) and the count
+    METHODS
+    --------------------
+    inc(value, amount): Adds amount to the count of the label value
+    render(): Returns the lines of the metric in the Prometheus text format
+    """
+    kind = 'counter'
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+
+    def inc(self, value=None, amount=1):
+        self.values[value] = self.values.get(value, 0) + amount
+
+    def render(self):
+        return ['{0}{1} {2}'.format(self.name, _labels(self.label, value), count) for value, count in sorted(self.values.items(), key=lambda item: str(item[0]))]
+
+
+class Gauge:
+    """
+    Value that is read when the metrics are rendered, so keeping it up to date costs nothing on the hot path
+    --------------------
+    read: Function that returns the value, or a dictionary of label value -> value when label is given
+    """
+    def __init__(self, name, help, read, label=None, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+        self.kind = kind
+
+    def render(self):
+        values = self.read()
+        if self.label is None:
+            return ['{0} {1}'.format(self.name, values)]
+        return ['{0}{1} {2}'.format(self.name, _labels(self.label, value), count) for value, count in sorted(values.items(), key=lambda item: str(item[0]))]
+
+
+class Histogram:
+    """
+    Histogram of observed values with fixed buckets, optionally split by the value of one label.
+    observe() is a bisect and two additions, so it can run on every event
+    --------------------
+    buckets: Tuple of the upper bounds of the buckets, in increasing order
+    METHODS
+    --------------------
+    observe(amount, value): Counts amount in the histogram of the label value
+    quantile(q, value): Returns the upper bound of the bucket that holds the q quantile (e.g. 0.99) of the label value
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, label=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        # label value -> [count per bucket (the last one is +Inf), sum]
+        self.values = {}
+
+    def observe(self, amount, value=None):
+        entry = self.values.get(value)
+        if entry is None:
+            entry = self.values[value] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, amount)] += 1
+        entry[1] += amount
+
+    def quantile(self, q, value=None):
+        entry = self.values.get(value)
+        if entry is None:
+            return 0.0
+        target = q * sum(entry[0])
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), entry[0]):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def render(self):
+        lines = []
+        for value, (counts, total) in sorted(self.values.items(), key=lambda item: str(item[0])):
+            prefix = '' if self.label is None else '{0}="{1}",'.format(self.label, value)
+            seen = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                seen += count
+                lines.append('{0}_bucket{{{1}le="{2}"}} {3}'.format(self.name, prefix, '+Inf' if bound == float('inf') else bound, seen))
+            lines.append('{0}_sum{1} {2}'.format(self.name, _labels(self.label, value), total))
+            lines.append('{0}_count{1} {2}'.format(self.name, _labels(self.label, value), seen))
+        return lines
+
+
+class Registry:
+    """
+    Registry of the metrics of the bot
+    --------------------
+    metrics: List of the registered Counters, Gauges and Histograms
+    METHODS
+    --------------------
+    counter(name, help, label): Registers and returns a Counter
+    gauge(name, help, read, label, kind): Registers and returns a Gauge. kind='counter' exposes a count kept elsewhere
+    histogram(name, help, buckets, label): Registers and returns a Histogram
+    render(): Returns every metric in the Prometheus text format
+    """
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, label=None):
+        return self._add(Counter(name, help, label))
+
+    def gauge(self, name, help, read, label=None, kind='gauge'):
+        return self._add(Gauge(name, help, read, label, kind))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, label=None):
+        return self._add(Histogram(name, help, buckets, label))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP {0} {1}'.format(metric.name, metric.help))
+            lines.append('# TYPE {0} {1}'.format(metric.name, metric.kind))
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Sampling profiler of the event loop thread. A background thread looks at the loop thread's stack every interval
+    seconds and counts the stacks that run through one of the watched files (e.g. the command handlers in discordRPS.py).
+    Nothing runs on the event loop, and nothing at all while the profiler is stopped
+    --------------------
+    interval: Float seconds between samples
+    files: Tuple of the file name endings whose frames make a sample count
+    samples: Counter of folded stacks ("outer;...;inner", the format of flame graph tools) and their number of samples
+    METHODS
+    --------------------
+    start(thread_id): Starts sampling the thread (the calling thread by default)
+    stop(): Stops sampling. The samples are kept until the next start()
+    running(): Returns True while sampling
+    folded(limit): Returns the most sampled stacks as lines of "stack count"
+    """
+    def __init__(self, interval=0.005, files=('discordRPS.py',)):
+        self.interval = interval
+        self.files = tuple(files)
+        self.samples = collections.Counter()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, thread_id=None):
+        if self._thread is not None:
+            return
+        self.samples = collections.Counter()
+        self._stop.clear()
+        target = thread_id if thread_id is not None else threading.get_ident()
+        self._thread = threading.Thread(target=self._run, args=(target,), name='rps-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def running(self):
+        return self._thread is not None
+
+    def _run(self, thread_id):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            watched = False
+            while frame is not None:
+                code = frame.f_code
+                # The module frame of the bot is under every stack, so only its functions count
+                watched = watched or (code.co_filename.endswith(self.files) and code.co_name != '<module>')
+                stack.append(code.co_name)
+                frame = frame.f_back
+            if watched:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self, limit=50):
+        return '\n'.join('{0} {1}'.format(stack, count) for stack, count in self.samples.most_common(limit)) + '\n'
+
+
+class RateLimitCounter(logging.Handler):
+    """
+    Logging handler that counts the 429 responses discord.py handles by itself, by method, from its 'discord.http' warnings
+    """
+    def __init__(self, counter):
+        super().__init__(logging.WARNING)
+        self.counter = counter
+
+    def emit(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith('We are being rate limited') and record.args:
+            self.counter.inc(record.args[0])
+
+
+def instrument_http(http, requests, latency):
+    """
+    Wraps http.request (discord.py's HTTPClient) so every REST call is counted in requests and timed in latency,
+    both by route ("METHOD /path/{parameter}", so every channel's calls add up under one route).
+    """
+    request = http.request
+
+    async def counted_request(route, **kwargs):
+        key = '{0} {1}'.format(route.method, route.path)
+        requests.inc(key)
+        start = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        finally:
+            latency.observe(time.perf_counter() - start, key)
+
+    http.request = counted_request
+
+
+async def loop_lag_probe(histogram, interval=0.5):
+    """
+    Observes in histogram how late the event loop wakes up from a sleep of interval seconds, forever.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - start - interval))
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server on the event loop that serves the metrics of a Registry
+    --------------------
+    GET /metrics: The metrics in the Prometheus text format
+    GET /profile: The folded stacks of the profiler; /profile/start and /profile/stop switch it on and off
+    METHODS
+    --------------------
+    start(host, port): Coroutine. Starts listening
+    close(): Coroutine. Stops listening
+    """
+    def __init__(self, registry, profiler=None):
+        self.registry = registry
+        self.profiler = profiler
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=9108):
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _respond(self, path):
+        if path == '/metrics':
+            return 200, self.registry.render()
+        if self.profiler is not None and path == '/profile/start':
+            self.profiler.start()
+            return 200, 'profiler started\n'
+        if self.profiler is not None and path == '/profile/stop':
+            self.profiler.stop()
+            return 200, 'profiler stopped\n'
+        if self.profiler is not None and path == '/profile':
+            return 200, self.profiler.folded()
+        return 404, 'not found\n'
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Skip the headers; no request has a body
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                status, body = 405, 'only GET is supported\n'
+            else:
+                status, body = self._respond(parts[1].split('?')[0])
+            data = body.encode()
+            writer.write('HTTP/1.0 {0} {1}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {2}\r\n\r\n'.format(
+                status, 'OK' if status == 200 else 'Error', len(data)).encode() + data)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
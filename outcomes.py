@@ -0,0 +1,96 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FORFEIT = 'ff'
+TIMEOUT = 'fft'
+
+
+class MoveSet:
+    """
+    Registry of the moves of a Rock-Paper-Scissors variant, with a precomputed outcome matrix over integer move codes
+    --------------------
+    name: String name of the variant
+    moves: List of (char, full) of the moves, in cyclic order: every move beats the moves an odd number of places before it
+    chars: List of every char; the index of a char is its code. The last two are FORFEIT ('ff') and TIMEOUT ('fft')
+    char_to_full: Dictionary that has mappings of char and its emoji
+    full_to_char: Dictionary that has mappings of emoji and its char
+    options: List of the chars a player can choose (the moves and FORFEIT)
+    table: Flat list of outcomes, where table[a * size + b] is 1 if code a wins code b, -1 if b wins a, and 0 if it is a tie
+    METHODS
+    --------------------
+    code(char): Returns the code of char
+    outcome(a, b): Returns the outcome of codes a and b
+    resolve(a, b): Returns the outcome of chars a and b
+    resolve_many(a_codes, b_codes): Returns the outcomes of many pairs of codes at once. Takes and returns numpy arrays
+                                    if numpy is installed and arrays are given, and lists otherwise
+    cyclic(n): Class method. Returns the odd n-move variant where each move beats (n - 1) / 2 others, for n up to 26.
+               These variants are only used by the engine (benchmarks and simulations): they are not in move_sets,
+               since their keycap and letter emojis do not show players which move beats which
+    """
+    def __init__(self, name, moves, forfeit_full="🏳️", timeout_full="⏲️"):
+        if len(moves) % 2 == 0:
+            raise ValueError('A balanced variant needs an odd number of moves, but {0} has {1}'.format(name, len(moves)))
+        self.name = name
+        self.moves = list(moves)
+        self.chars = [char for char, full in moves] + [FORFEIT, TIMEOUT]
+        self.char_to_full = dict(moves)
+        self.char_to_full[FORFEIT] = forfeit_full
+        self.char_to_full[TIMEOUT] = timeout_full
+        self.full_to_char = {full: char for char, full in self.char_to_full.items()}
+        self.options = [char for char, full in moves] + [FORFEIT]
+
+        self._codes = {char: code for code, char in enumerate(self.chars)}
+        self.size = len(self.chars)
+        self.table = [self._compute(a, b) for a in range(self.size) for b in range(self.size)]
+        self._outcomes = {a: {b: self.table[self._codes[a] * self.size + self._codes[b]] for b in self.chars} for a in self.chars}
+        self._array = numpy.array(self.table, dtype=numpy.int8) if numpy is not None else None
+
+    def _compute(self, a, b):
+        n = len(self.moves)
+        if a >= n and b >= n:
+            # Both players forfeited or ran out of time: nobody wins
+            return 0
+        if a >= n:
+            return -1
+        if b >= n:
+            return 1
+        if a == b:
+            return 0
+        return 1 if (a - b) % n % 2 == 1 else -1
+
+    def code(self, char):
+        return self._codes[char]
+
+    def outcome(self, a, b):
+        return self.table[a * self.size + b]
+
+    def resolve(self, a, b):
+        return self._outcomes[a][b]
+
+    def resolve_many(self, a_codes, b_codes):
+        if self._array is not None and isinstance(a_codes, numpy.ndarray):
+            return self._array[a_codes * self.size + b_codes]
+        table, size = self.table, self.size
+        return [table[a * size + b] for a, b in zip(a_codes, b_codes)]
+
+    @classmethod
+    def cyclic(cls, n):
+        # Keycap digits for up to 10 moves and regional indicator letters for up to 26. There are no more emojis like them
+        if n > 26:
+            raise ValueError('A cyclic variant can have at most 26 moves, but {0} were asked for'.format(n))
+        if n <= 10:
+            fulls = [str(i) + "️⃣" for i in range(n)]
+        else:
+            fulls = [chr(0x1F1E6 + i) for i in range(n)]
+        return cls('{0}-move cyclic'.format(n), [('m' + str(i), fulls[i]) for i in range(n)])
+
+
+RPS = MoveSet('Rock Paper Scissors', [('r', "✊"), ('p', "🖐️"), ('s', "✌️")])
+RPSLS = MoveSet('Rock Paper Scissors Lizard Spock', [('r', "✊"), ('p', "🖐️"), ('s', "✌️"), ('k', "🖖"), ('l', "🦎")])
+
+move_sets = {
+    'rps': RPS,
+    'rpsls': RPSLS,
+}
@@ -0,0 +1,124 @@
+import array
+import collections
+import random
+import sys
+
+# A context row of the model is halved once one of its counts reaches ROW_LIMIT, so recent moves count the most
+# and every count fits in a byte
+ROW_LIMIT = 64
+# How much each order of the model counts, from order 0 (plain frequencies) up
+ORDER_WEIGHTS = (1, 2, 4)
+
+
+class MoveModel:
+    """
+    Move model of one player in one variant: counts of the player's next move after every context of up to
+    len(ORDER_WEIGHTS) - 1 previous moves, in one flat byte array
+    --------------------
+    counts: array('B') of the counts: one row per context, the rows of order 0, 1, ... one after the other. A row holds one count per move
+    context: Integer code of the last moves, the latest in the lowest digit (base n)
+    length: Integer number of moves in context, up to the highest order
+    """
+    __slots__ = ('counts', 'context', 'length')
+
+    def __init__(self, n):
+        size = sum(n ** order for order in range(len(ORDER_WEIGHTS))) * n
+        self.counts = array.array('B', bytes(size))
+        self.context = 0
+        self.length = 0
+
+
+class MovePredictor:
+    """
+    Predicts the next move of a player from an n-gram (Markov) model of their past moves, and picks the bot's move
+    that does best against the prediction. Models are updated after every round and kept in a LRU cache
+    --------------------
+    max_models: Integer number of models kept; the least recently used model is dropped when there are more
+    explore: Float probability of playing a random move, so the bot cannot be read either
+    models: OrderedDict that has mappings of (user_id, variant name) and MoveModel, least recently used first
+    predictions, evictions: Integer counters
+    METHODS
+    --------------------
+    choose(user_id, move_set): Returns the char of the bot's move against the player
+    observe(user_id, move_set, char): Adds the player's move to their model. FORFEIT and TIMEOUT are ignored
+    memory(): Returns the approximate bytes used by the models
+    """
+    def __init__(self, max_models=100000, explore=0.1, seed=None):
+        self.max_models = max_models
+        self.explore = explore
+        self.models = collections.OrderedDict()
+        self.rng = random.Random(seed)
+
+        self.predictions = 0
+        self.evictions = 0
+
+    def _model(self, user_id, move_set, create):
+        key = (user_id, move_set.name)
+        model = self.models.get(key)
+        if model is not None:
+            self.models.move_to_end(key)
+        elif create:
+            model = self.models[key] = MoveModel(len(move_set.moves))
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+                self.evictions += 1
+        return model
+
+    def _rows(self, model, n):
+        # Yields (weight, offset of the row) of every order the model has enough moves for
+        offset, context, base = 0, 0, 1
+        for order, weight in enumerate(ORDER_WEIGHTS):
+            if order > model.length:
+                return
+            if order:
+                context = model.context % base
+            yield weight, offset + context * n
+            offset += base * n
+            base *= n
+
+    def choose(self, user_id, move_set):
+        self.predictions += 1
+        n = len(move_set.moves)
+        model = self._model(user_id, move_set, False)
+        if model is None or self.rng.random() < self.explore:
+            return move_set.chars[self.rng.randrange(n)]
+
+        # Estimated chances of each of the player's moves
+        scores = [0.0] * n
+        counts = model.counts
+        for weight, row in self._rows(model, n):
+            total = sum(counts[row:row + n])
+            if total:
+                scale = weight / (total + 1)
+                for move in range(n):
+                    scores[move] += scale * counts[row + move]
+
+        best, best_value = [], None
+        for move in range(n):
+            value = sum(scores[other] * move_set.outcome(move, other) for other in range(n) if scores[other])
+            if best_value is None or value > best_value:
+                best, best_value = [move], value
+            elif value == best_value:
+                best.append(move)
+        return move_set.chars[self.rng.choice(best)]
+
+    def observe(self, user_id, move_set, char):
+        n = len(move_set.moves)
+        move = move_set.code(char)
+        if move >= n:
+            return
+        model = self._model(user_id, move_set, True)
+        counts = model.counts
+        for weight, row in self._rows(model, n):
+            counts[row + move] += 1
+            if counts[row + move] >= ROW_LIMIT:
+                for i in range(row, row + n):
+                    counts[i] >>= 1
+
+        highest = len(ORDER_WEIGHTS) - 1
+        model.context = (model.context * n + move) % n ** highest
+        model.length = min(model.length + 1, highest)
+
+    def memory(self):
+        # The OrderedDict entry and its key tuple take about 100 bytes more per model
+        return sys.getsizeof(self.models) + sum(sys.getsizeof(model) + sys.getsizeof(model.counts) + 100 for model in self.models.values())
@@ -0,0 +1,131 @@
+import asyncio
+import math
+
+
+class Timer:
+    """
+    A single callback scheduled on a TimerWheel
+    --------------------
+    target: Integer tick number that the timer fires on
+    rounds: Integer number of full wheel turns left before the timer fires
+    callback: Function called (with args) when the timer fires. If it returns a coroutine, the coroutine is run as a task
+    cancelled: Boolean that is True once the timer was cancelled or has fired
+    """
+    __slots__ = ('target', 'rounds', 'callback', 'args', 'cancelled')
+
+    def __init__(self, target, rounds, callback, args):
+        self.target = target
+        self.rounds = rounds
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel that owns every countdown of every RPS Game, so that a single task wakes up
+    once per tick instead of one sleeping task per player per game.
+    --------------------
+    tick: Float length of one slot of the wheel in seconds
+    slot_count: Integer number of slots in the wheel
+    METHODS
+    --------------------
+    call_later(delay, callback, *args): Schedules callback(*args) to run once after delay seconds. Returns the Timer
+    cancel(timer): Cancels timer if it has not fired yet. Returns True if it was cancelled by this call
+    pending(): Returns the number of timers that have neither fired nor been cancelled
+    start(): Starts the wheel task on the running event loop (called automatically by call_later)
+    stop(): Stops the wheel task. Pending timers are kept and resume on the next start()
+    """
+    def __init__(self, tick=0.1, slot_count=512):
+        self.tick = tick
+        self.slot_count = slot_count
+        self.slots = [set() for _ in range(slot_count)]
+
+        self._count = 0
+        self._origin = None
+        self._tick_no = 0
+        self._task = None
+        self._wakeup = None
+
+    def _now_tick(self):
+        return int((asyncio.get_event_loop().time() - self._origin) / self.tick)
+
+    def call_later(self, delay, callback, *args):
+        if self._task is None:
+            self.start()
+        if not self._count:
+            # The wheel was idle, so bring the cursor up to date before placing the timer
+            self._tick_no = max(self._tick_no, self._now_tick())
+
+        # Round up, so that a timer never fires before its delay has passed
+        target = math.ceil((asyncio.get_event_loop().time() + delay - self._origin) / self.tick)
+        target = max(target, self._tick_no)
+        timer = Timer(target, (target - self._tick_no) // self.slot_count, callback, args)
+
+        self.slots[target % self.slot_count].add(timer)
+        self._count += 1
+        self._wakeup.set()
+        return timer
+
+    def cancel(self, timer):
+        if timer is None or timer.cancelled:
+            return False
+        timer.cancelled = True
+        self.slots[timer.target % self.slot_count].discard(timer)
+        self._count -= 1
+        return True
+
+    def pending(self):
+        return self._count
+
+    def start(self):
+        if self._task is not None:
+            return
+        loop = asyncio.get_event_loop()
+        if self._origin is None:
+            self._origin = loop.time()
+            self._tick_no = 0
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            if not self._count:
+                # Nothing to count down; sleep until a timer is scheduled
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            delay = self._origin + self._tick_no * self.tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # Advance the cursor first, so timers scheduled by the callbacks land in the future
+            tick_no = self._tick_no
+            self._tick_no += 1
+            self._fire(loop, tick_no)
+
+    def _fire(self, loop, tick_no):
+        slot = self.slots[tick_no % self.slot_count]
+        due = []
+        for timer in slot:
+            if timer.rounds > 0:
+                timer.rounds -= 1
+            else:
+                due.append(timer)
+
+        for timer in due:
+            slot.discard(timer)
+            timer.cancelled = True
+            self._count -= 1
+            try:
+                result = timer.callback(*timer.args)
+                if asyncio.iscoroutine(result):
+                    loop.create_task(result)
+            except Exception as e:
+                loop.call_exception_handler({'message': 'TimerWheel callback failed', 'exception': e})
@@ -0,0 +1,334 @@
+import asyncio
+import json
+import os
+import sys
+
+# Match ids are handed out from blocks of ID_BLOCK; only the end of the current block is written to disk
+ID_BLOCK = 1000
+# Seconds the matches of a shard that lost its connection are kept for it to reconnect
+SHARD_GRACE = 30
+# Seconds between attempts of a shard to connect to the coordinator again
+RECONNECT_INTERVAL = 1
+
+
+class Coordinator:
+    """
+    Coordination service of a sharded deployment, listening on a Unix socket. Every shard keeps one connection to it.
+    It locks players, so that a user can only be in one game across all shards, and hands out match ids that are
+    unique across shards and restarts. Discord only sends DM events to shard 0, so it also forwards the reactions on a
+    DM prompt from shard 0 to the shard that owns the game.
+    Requests and replies are JSON lines: {"op": "hello", "shard": 1, "matches": [...]}, {"op": "lock", "req": 7, "users": [...]},
+    {"op": "unlock", "match_id": ...}, {"op": "route", "match_id": ..., "message_id": ...}, {"op": "forward", "event": {...}}
+    The matches of a hello are the ones the shard still plays, as {"match_id", "users", "messages"}. A shard that lost its
+    connection keeps its matches for grace seconds; once it says hello again they are replaced by the ones it still plays.
+    --------------------
+    path: String path of the Unix socket
+    ids_path: String path of the file that keeps the end of the last block of match ids
+    grace: Float seconds the matches of a disconnected shard are kept before its players are released
+    players: Dictionary that has mappings of user_id(int) and the match_id of the game the user is in
+    matches: Dictionary that has mappings of match_id(int) and (shard_id, user_ids, message_ids)
+    routes: Dictionary that has mappings of the message_id(int) of a DM prompt and its match_id
+    locked, refused, forwarded: Integer counters of lock requests that were granted or refused, and of forwarded events
+    METHODS
+    --------------------
+    start(): Coroutine. Starts listening
+    close(): Coroutine. Stops listening
+    lock(shard_id, user_ids): Locks the users for a new match of the shard. Returns the match_id, or None if one of them is busy
+    unlock(match_id): Releases the users and routes of a match
+    """
+    def __init__(self, path='rps_coordinator.sock', ids_path='rps_match_ids', grace=SHARD_GRACE):
+        self.path = path
+        self.ids_path = ids_path
+        self.grace = grace
+        self.players = {}
+        self.matches = {}
+        self.routes = {}
+        self.shards = {}
+
+        self.locked = 0
+        self.refused = 0
+        self.forwarded = 0
+        self._server = None
+        self._next_id = None
+        self._block_end = None
+        # shard_id -> TimerHandle that releases the matches of a disconnected shard
+        self._expiry = {}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in self.shards.values():
+            writer.close()
+        for handle in self._expiry.values():
+            handle.cancel()
+        self._expiry.clear()
+
+    def _new_id(self):
+        if self._next_id is None:
+            try:
+                with open(self.ids_path) as ids:
+                    self._next_id = int(ids.read())
+            except (OSError, ValueError):
+                self._next_id = 0
+            self._block_end = self._next_id
+        if self._next_id >= self._block_end:
+            # The block is reserved on disk before any of its ids is used, so a restart never hands one out again
+            self._block_end = self._next_id + ID_BLOCK
+            with open(self.ids_path + '.tmp', 'w') as ids:
+                ids.write(str(self._block_end))
+            os.replace(self.ids_path + '.tmp', self.ids_path)
+        match_id = self._next_id
+        self._next_id += 1
+        return match_id
+
+    def lock(self, shard_id, user_ids):
+        if any(user_id in self.players for user_id in user_ids):
+            self.refused += 1
+            return None
+        match_id = self._new_id()
+        for user_id in user_ids:
+            self.players[user_id] = match_id
+        self.matches[match_id] = (shard_id, list(user_ids), [])
+        self.locked += 1
+        return match_id
+
+    def unlock(self, match_id):
+        match = self.matches.pop(match_id, None)
+        if match is None:
+            return
+        for user_id in match[1]:
+            if self.players.get(user_id) == match_id:
+                del self.players[user_id]
+        for message_id in match[2]:
+            self.routes.pop(message_id, None)
+
+    def _release_shard(self, shard_id, keep=()):
+        # A shard that went away cannot finish its games, so its players are free to play elsewhere
+        for match_id in [match_id for match_id, match in self.matches.items() if match[0] == shard_id and match_id not in keep]:
+            self.unlock(match_id)
+
+    def _expire_shard(self, shard_id):
+        self._expiry.pop(shard_id, None)
+        if shard_id not in self.shards:
+            self._release_shard(shard_id)
+
+    def _restore_shard(self, shard_id, matches):
+        # The matches that ended while the shard was away are released, and the ones it still plays are kept or locked again
+        self._release_shard(shard_id, {match['match_id'] for match in matches})
+        for match in matches:
+            match_id = match['match_id']
+            if match_id not in self.matches:
+                # Released after the grace period (or the coordinator restarted). Players who started another game since stay in it
+                self.matches[match_id] = (shard_id, [], [])
+                for user_id in match['users']:
+                    if user_id not in self.players:
+                        self.players[user_id] = match_id
+                        self.matches[match_id][1].append(user_id)
+            routed = self.matches[match_id][2]
+            for message_id in match['messages']:
+                if message_id not in routed:
+                    routed.append(message_id)
+                    self.routes[message_id] = match_id
+
+    def _send(self, writer, message):
+        writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    def _request(self, shard_id, writer, request):
+        op = request.get('op')
+        if op == 'lock':
+            match_id = self.lock(shard_id, request['users'])
+            self._send(writer, {'req': request['req'], 'match_id': match_id})
+        elif op == 'unlock':
+            self.unlock(request['match_id'])
+        elif op == 'route':
+            match = self.matches.get(request['match_id'])
+            if match is not None:
+                match[2].append(request['message_id'])
+                self.routes[request['message_id']] = request['match_id']
+        elif op == 'forward':
+            match = self.matches.get(self.routes.get(request['event']['message_id']))
+            if match is not None and match[0] in self.shards:
+                self.forwarded += 1
+                self._send(self.shards[match[0]], {'op': 'event', 'event': request['event']})
+
+    async def _handle(self, reader, writer):
+        shard_id = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                if request.get('op') == 'hello':
+                    shard_id = request['shard']
+                    handle = self._expiry.pop(shard_id, None)
+                    if handle is not None:
+                        handle.cancel()
+                    self._restore_shard(shard_id, request.get('matches', []))
+                    self.shards[shard_id] = writer
+                elif shard_id is not None:
+                    self._request(shard_id, writer, request)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if shard_id is not None and self.shards.get(shard_id) is writer:
+                del self.shards[shard_id]
+                # The shard's games go on while it reconnects, so its players stay locked for a while
+                if shard_id not in self._expiry:
+                    self._expiry[shard_id] = asyncio.get_event_loop().call_later(self.grace, self._expire_shard, shard_id)
+            writer.close()
+
+
+class CoordinatorClient:
+    """
+    Connection of one shard to the Coordinator
+    --------------------
+    shard_id: Integer id of the shard
+    on_event: Coroutine function on_event(event) that handles the events forwarded to this shard
+    live_matches: Function that returns the matches the shard still plays, as a list of {"match_id", "users", "messages"}.
+                  They are sent with every hello, so the coordinator keeps them locked and routed after a reconnect
+    METHODS
+    --------------------
+    connect(path): Coroutine. Connects and says hello. Once the connection is lost, it connects again every RECONNECT_INTERVAL seconds
+    connected(): Returns True while the connection is up
+    lock(user_ids): Coroutine. Returns the match_id of a new match of the users, or None if one of them is in another game.
+                    If the connection was lost, it tries to connect again first; raises ConnectionError if that fails or
+                    the connection drops before the answer
+    unlock(match_id): Releases the users of the match (does not wait)
+    route(match_id, message_id): Has reactions on the DM prompt message_id forwarded to this shard (does not wait)
+    forward(event): Sends an event that reached shard 0 to the shard that owns its message (does not wait)
+    close(): Coroutine. Disconnects
+    """
+    def __init__(self, shard_id, on_event=None, live_matches=None):
+        self.shard_id = shard_id
+        self.on_event = on_event
+        self.live_matches = live_matches
+        self.path = None
+        self._reader = None
+        self._writer = None
+        self._task = None
+        self._requests = {}
+        self._next_req = 0
+        self._connecting = None
+        self._retrying = None
+        self._closed = False
+
+    async def connect(self, path='rps_coordinator.sock'):
+        self.path = path
+        self._closed = False
+        self._reader, self._writer = await asyncio.open_unix_connection(path)
+        self._task = asyncio.get_event_loop().create_task(self._read())
+        matches = self.live_matches() if self.live_matches is not None else []
+        self._send({'op': 'hello', 'shard': self.shard_id, 'matches': matches})
+
+    def connected(self):
+        return self._task is not None and not self._task.done() and self._writer is not None and not self._writer.is_closing()
+
+    def _send(self, message):
+        # Messages to a lost coordinator are dropped; it already released everything of this shard
+        if self.connected():
+            self._writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    async def _reconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        try:
+            await self.connect(self.path)
+        except OSError as e:
+            raise ConnectionError('Could not connect to the coordinator again') from e
+
+    def _connect_again(self):
+        # Every caller that finds the connection down waits for the same attempt to connect again
+        if self._connecting is None or self._connecting.done():
+            self._connecting = asyncio.ensure_future(self._reconnect())
+        return self._connecting
+
+    async def _retry(self):
+        while not self._closed and not self.connected():
+            try:
+                await asyncio.shield(self._connect_again())
+            except ConnectionError:
+                await asyncio.sleep(RECONNECT_INTERVAL)
+
+    async def lock(self, user_ids):
+        if not self.connected():
+            await asyncio.shield(self._connect_again())
+        self._next_req += 1
+        future = asyncio.get_event_loop().create_future()
+        self._requests[self._next_req] = future
+        self._send({'op': 'lock', 'req': self._next_req, 'users': list(user_ids)})
+        return await future
+
+    def unlock(self, match_id):
+        self._send({'op': 'unlock', 'match_id': match_id})
+
+    def route(self, match_id, message_id):
+        self._send({'op': 'route', 'match_id': match_id, 'message_id': message_id})
+
+    def forward(self, event):
+        self._send({'op': 'forward', 'event': event})
+
+    async def _read(self):
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get('op') == 'event':
+                    if self.on_event is not None:
+                        loop.create_task(self.on_event(message['event']))
+                else:
+                    future = self._requests.pop(message['req'], None)
+                    if future is not None and not future.done():
+                        future.set_result(message['match_id'])
+        finally:
+            error = ConnectionError('The connection to the coordinator was lost')
+            for future in self._requests.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._requests.clear()
+            if not self._closed and (self._retrying is None or self._retrying.done()):
+                self._retrying = loop.create_task(self._retry())
+
+    async def close(self):
+        self._closed = True
+        if self._retrying is not None:
+            self._retrying.cancel()
+            self._retrying = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+async def run_shards(shard_count, path='rps_coordinator.sock', ids_path='rps_match_ids', argv=None):
+    """
+    Runs the Coordinator and starts one process per shard, with RPS_SHARD_ID and RPS_SHARDS set, running argv
+    (this script by default). Returns once every shard process has exited.
+    """
+    coordinator = Coordinator(path, ids_path)
+    await coordinator.start()
+    if argv is None:
+        argv = [sys.executable] + sys.argv
+    processes = []
+    for shard_id in range(shard_count):
+        env = dict(os.environ, RPS_SHARD_ID=str(shard_id), RPS_SHARDS=str(shard_count), RPS_COORDINATOR=path)
+        processes.append(await asyncio.create_subprocess_exec(*argv, env=env))
+    try:
+        await asyncio.gather(*(process.wait() for process in processes))
+    finally:
+        for process in processes:
+            if process.returncode is None:
+                process.terminate()
+        await coordinator.close()
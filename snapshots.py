@@ -0,0 +1,199 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import time
+
+from flushing import flush_forever
+
+log = logging.getLogger('rps.journal')
+
+
+def apply_event(states, event):
+    """
+    Applies one journal event to states, a dictionary that has mappings of game_id(int) and the state of the game.
+    Events are lists: ['create', game_id, guild_id, host_id, opponent_id, time, variant, best_of, practice, host_name, opponent_name],
+    ['message', game_id, role, channel_id, message_id, deadline], ['answer', game_id, role, response],
+    ['round', game_id, round, host_wins, opponent_wins, ties, deadline] and ['end', game_id]
+    """
+    kind, game_id = event[0], event[1]
+    if kind == 'create':
+        states[game_id] = {
+            'id': game_id, 'guild_id': event[2], 'host_id': event[3], 'opponent_id': event[4], 'time': event[5],
+            'variant': event[6] if len(event) > 6 else 'rps',
+            'best_of': event[7] if len(event) > 7 else 1, 'practice': event[8] if len(event) > 8 else False,
+            'host_name': event[9] if len(event) > 9 else None, 'opponent_name': event[10] if len(event) > 10 else None,
+            'round': 1, 'host_wins': 0, 'opponent_wins': 0, 'ties': 0,
+            'host': {}, 'opponent': {}, 'server': {},
+        }
+        return
+
+    state = states.get(game_id)
+    if state is None:
+        return
+    if kind == 'message':
+        state[event[2]].update(channel_id=event[3], message_id=event[4], deadline=event[5])
+    elif kind == 'answer':
+        state[event[2]]['response'] = event[3]
+    elif kind == 'round':
+        state.update(round=event[2], host_wins=event[3], opponent_wins=event[4], ties=event[5])
+        for role in ('host', 'opponent'):
+            state[role].pop('response', None)
+            state[role]['deadline'] = event[6]
+    elif kind == 'end':
+        del states[game_id]
+
+
+class GameJournal:
+    """
+    Journal of the state of every active Game, so that games survive a restart or crash.
+    Every change is appended to the journal file as one JSON line. Once the journal gets long, the active games
+    are written to a snapshot file and the journal starts over, so loading never replays more than compact_every events.
+    --------------------
+    path: String path of the journal. The snapshot is kept next to it, at path + '.snapshot'
+    flush_interval: Float seconds between writes of the pending events
+    compact_every: Integer number of journal events after which a snapshot is taken
+    fsync: Boolean that makes every write also survive a power loss, not only a crash of the bot
+    states: Dictionary that has mappings of game_id(int) and the journaled state of every active game
+    failed_writes: Integer number of writes that failed (e.g. the disk was full). Their events are written again later
+    METHODS
+    --------------------
+    create(game): Journals a new game
+    message(game, role, message, deadline): Journals the "host", "opponent" or "server" message of game, and the wall clock deadline of the player
+    answer(game, role, response): Journals the response of a player
+    next_round(game, deadline): Journals the score of a series and the start of its next round, which clears the responses
+    end(game): Journals that game is over
+    end_state(game_id): Journals that the game that had game_id before a restart is over (e.g. once it was resumed under a new id)
+    load(): Reads the snapshot and the journal. Returns the list of states of the games that were active
+    flush(): Coroutine. Writes every pending event. If the write fails, the events stay pending and the error is raised
+    close(): Coroutine. Flushes and stops the writer
+    """
+    def __init__(self, path='rps_games.journal', flush_interval=0.2, compact_every=10000, fsync=False):
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self.states = {}
+        self.pending = []
+        self.journal_length = 0
+        self.failed_writes = 0
+        self._task = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def _append(self, event):
+        apply_event(self.states, event)
+        self.pending.append(json.dumps(event, separators=(',', ':')))
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(flush_forever(self, lambda: asyncio.sleep(self.flush_interval), log, 'game journal'))
+
+    def create(self, game):
+        self._append(['create', game.id, game.guild_id, game.host_id, game.opponent_id, game.time, game.variant, game.best_of, game.practice, game.host_name, game.opponent_name])
+
+    def message(self, game, role, message, deadline=None):
+        self._append(['message', game.id, role, message.channel.id, message.id, deadline])
+
+    def answer(self, game, role, response):
+        self._append(['answer', game.id, role, response])
+
+    def next_round(self, game, deadline):
+        self._append(['round', game.id, game.round, game.host_wins, game.opponent_wins, game.ties, deadline])
+
+    def end(self, game):
+        self.end_state(game.id)
+
+    def end_state(self, game_id):
+        if game_id in self.states:
+            self._append(['end', game_id])
+
+    def load(self):
+        states = {}
+        try:
+            with open(self.snapshot_path) as snapshot:
+                for state in json.load(snapshot):
+                    states[state['id']] = state
+        except (OSError, ValueError):
+            pass
+
+        length = 0
+        try:
+            with open(self.path) as journal:
+                for line in journal:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # The last line is cut off if the bot died while writing it
+                        continue
+                    apply_event(states, event)
+                    length += 1
+        except OSError:
+            pass
+
+        self.states = states
+        self.journal_length = length
+        return list(states.values())
+
+    async def flush(self):
+        loop = asyncio.get_event_loop()
+        if self.journal_length + len(self.pending) >= self.compact_every:
+            # The snapshot already has every pending event in it
+            snapshot = json.dumps(list(self.states.values()), separators=(',', ':'))
+            lines, length = self.pending, self.journal_length
+            self.pending = []
+            self.journal_length = 0
+            try:
+                await loop.run_in_executor(self._executor, self._compact, snapshot)
+            except Exception:
+                # The journal was not started over, so its events and the pending ones still count towards the next snapshot
+                self.pending = lines + self.pending
+                self.journal_length = length
+                self.failed_writes += 1
+                raise
+        elif self.pending:
+            lines, self.pending = self.pending, []
+            self.journal_length += len(lines)
+            try:
+                await loop.run_in_executor(self._executor, self._write, lines)
+            except Exception:
+                # Written again before the newer events, so they are replayed in order
+                self.pending = lines + self.pending
+                self.journal_length -= len(lines)
+                self.failed_writes += 1
+                raise
+
+    def _write(self, lines):
+        with open(self.path, 'a') as journal:
+            journal.write('\n'.join(lines) + '\n')
+            if self.fsync:
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def _compact(self, snapshot):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as tmp:
+            tmp.write(snapshot)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        open(self.path, 'w').close()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        self._executor.shutdown()
+
+
+def remaining_time(player_state, now=None):
+    """
+    Returns the whole seconds the player has left according to the journaled deadline, or 0 if there is no deadline.
+    """
+    deadline = player_state.get('deadline')
+    if deadline is None:
+        return 0
+    if now is None:
+        now = time.time()
+    return max(0, int(deadline - now))
@@ -0,0 +1,145 @@
+import asyncio
+import inspect
+
+
+def seeded_pairs(players):
+    """
+    Returns the pairs of the first round of a single elimination bracket: the best seed plays the worst, and so on.
+    When the number of players is not a power of two, the best seeds get a bye, shown as a pair of (player, None).
+    """
+    size = 1
+    while size < len(players):
+        size *= 2
+    slots = list(players) + [None] * (size - len(players))
+
+    # Standard bracket order, so the two best seeds can only meet in the final
+    order = [0]
+    while len(order) < size:
+        order = [x for seed in order for x in (seed, 2 * len(order) - 1 - seed)]
+    return [(slots[order[i]], slots[order[i + 1]]) for i in range(0, size, 2)]
+
+
+class Tournament:
+    """
+    Runs a single elimination or Swiss tournament, playing all matches of a round at once. Only the setup of the matches
+    (the Discord requests) is limited; waiting for the players' answers is not
+    --------------------
+    players: List of players (anything with an id), best seed first
+    play_match: Coroutine function play_match(host, opponent) that sets up one game and returns an awaitable of its result:
+                1 if host won, -1 if opponent won and 0 if nobody did (a tie, both timed out, or the game could not start).
+                It may return the result itself when there is nothing to wait for
+    mode: String 'single' for single elimination or 'swiss'
+    concurrency: Integer maximum number of matches being set up at once
+    max_rematches: Integer number of times a tied single elimination match is replayed before the better seed advances
+    swiss_rounds: Integer number of Swiss rounds (the log2 of the number of players by default)
+    scores: Dictionary that has mappings of player id and points (1 for a win or bye, 0.5 for a tie)
+    round_times: List of the seconds each round took
+    on_round: Coroutine function on_round(number, results) called after every round with a list of (host, opponent, winner)
+    METHODS
+    --------------------
+    run(): Coroutine. Plays the whole tournament. Returns the standings, a list of (player, points) with the winner first
+    """
+    def __init__(self, players, play_match, mode='single', concurrency=64, max_rematches=2, swiss_rounds=None, on_round=None):
+        if mode not in ('single', 'swiss'):
+            raise ValueError('mode was expected to be either "single" or "swiss", but it was {0!r}'.format(mode))
+        self.players = list(players)
+        self.play_match = play_match
+        self.mode = mode
+        self.concurrency = concurrency
+        self.max_rematches = max_rematches
+        if swiss_rounds is None:
+            swiss_rounds = max(1, (len(self.players) - 1).bit_length())
+        self.swiss_rounds = swiss_rounds
+        self.on_round = on_round
+
+        self.seeds = {player.id: seed for seed, player in enumerate(self.players)}
+        self.scores = {player.id: 0.0 for player in self.players}
+        self.played = {player.id: set() for player in self.players}
+        self.round_times = []
+        self._semaphore = None
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.mode == 'single':
+            await self._run_single()
+        else:
+            await self._run_swiss()
+        standings = sorted(self.players, key=lambda player: (-self.scores[player.id], self.seeds[player.id]))
+        return [(player, self.scores[player.id]) for player in standings]
+
+    async def _run_single(self):
+        pairs = seeded_pairs(self.players)
+        number = 1
+        while pairs:
+            winners = await self._play_round(number, pairs)
+            # A bracket keeps its shape: the winners of neighbouring matches meet in the next round
+            pairs = [(winners[i], winners[i + 1]) for i in range(0, len(winners) - 1, 2)]
+            number += 1
+        if len(self.players) == 1:
+            self.scores[self.players[0].id] += 1
+
+    async def _run_swiss(self):
+        for number in range(1, self.swiss_rounds + 1):
+            await self._play_round(number, self._swiss_pairs())
+
+    def _swiss_pairs(self):
+        # Players with the same score meet, avoiding rematches where possible; the lowest player left out gets a bye
+        order = sorted(self.players, key=lambda player: (-self.scores[player.id], self.seeds[player.id]))
+        pairs = []
+        if len(order) % 2:
+            pairs.append((order.pop(), None))
+        while order:
+            host = order.pop(0)
+            index = next((i for i, player in enumerate(order) if player.id not in self.played[host.id]), 0)
+            pairs.append((host, order.pop(index)))
+        return pairs
+
+    async def _play_round(self, number, pairs):
+        # The clock of the event loop, which the countdowns and rate limits go by as well
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        winners = await asyncio.gather(*[self._decide(host, opponent) for host, opponent in pairs])
+        self.round_times.append(loop.time() - start)
+        if self.on_round is not None:
+            await self.on_round(number, [(host, opponent, winner) for (host, opponent), winner in zip(pairs, winners)])
+        return winners
+
+    async def _play(self, host, opponent):
+        try:
+            async with self._semaphore:
+                result = await self.play_match(host, opponent)
+            # The slot is free again while the players answer
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception:
+            return 0
+
+    async def _decide(self, host, opponent):
+        """
+        Plays one pairing and updates the scores. Returns the player who advances (None for a Swiss tie).
+        """
+        if opponent is None:
+            self.scores[host.id] += 1
+            return host
+
+        self.played[host.id].add(opponent.id)
+        self.played[opponent.id].add(host.id)
+        rematches = self.max_rematches if self.mode == 'single' else 0
+        for attempt in range(rematches + 1):
+            won = await self._play(host, opponent)
+            if won == 1:
+                self.scores[host.id] += 1
+                return host
+            if won == -1:
+                self.scores[opponent.id] += 1
+                return opponent
+
+        if self.mode == 'swiss':
+            self.scores[host.id] += 0.5
+            self.scores[opponent.id] += 0.5
+            return None
+        # Still tied after every rematch: the better seed advances
+        winner = host if self.seeds[host.id] < self.seeds[opponent.id] else opponent
+        self.scores[winner.id] += 1
+        return winner